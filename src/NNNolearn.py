@@ -15,6 +15,7 @@ import theano
 from nolearn.lasagne import NeuralNet
 from nolearn.lasagne import TrainSplit
 from nolearn.lasagne import objective
+from nolearn.lasagne import BatchIterator
 
 import numpy as np
 import pickle
@@ -50,6 +51,43 @@ class AdjustVariable(object):
         getattr(nn, self.name).set_value(new_value)
 
 
+class AugmentedBatchIterator(BatchIterator):
+    # the net is fitted on sample indices instead of images, and the batches of images are made from the
+    # indices by a data_manager.AugmentedImages, so the rotated images never all exist at once
+    def __init__(self, batch_size, images, shuffle=False):
+        BatchIterator.__init__(self, batch_size)
+        self.images = images
+        self.shuffle = shuffle
+
+    def __iter__(self):
+        count = len(self.X)
+        order = np.random.permutation(count) if self.shuffle else np.arange(count)
+        for start in range(0, count, self.batch_size):
+            Xb, yb = self.images.get_batch(self.X[np.sort(order[start:start + self.batch_size])])
+            Xb = Xb.reshape((-1, 1) + self.images.image_shape)
+            yield Xb, (yb.astype(np.int32) if self.y is not None else None)
+
+class SliceSplit(object):
+    # the samples are in the shuffled order of load_all_images, so their last eval_size is a fair validation
+    # set. slicing copies nothing, unlike TrainSplit's stratified fancy indexing
+    def __init__(self, eval_size=0.2):
+        self.eval_size = eval_size
+
+    def __call__(self, X, y, net):
+        count = int(len(y) * (1 - self.eval_size))
+        return X[:count], X[count:], y[:count], y[count:]
+
+# Load the dataset
+print("Loading data...")
+
+# the four rotations of every image, trimmed by 5 pixels to the 38x38 the input layer takes, made a batch at
+# a time from the cached images. load_all_images shuffled them, so the last eval_size of the samples are all
+# the rotations of the last images, a fair validation set
+imgs, clss = data_manager.load_all_images()
+images = data_manager.AugmentedImages(imgs, clss, rotations=4, edge=5)
+images.mean, images.std = images.get_stats()
+samples = np.arange(len(images))
+
 convnet = NeuralNet(
     layers = [
         (InputLayer, {'shape': (None, 1, 38,38)}),
@@ -79,37 +117,18 @@ convnet = NeuralNet(
     #update_learning_rate=.01,
     verbose=2,
     max_epochs = 200,
+    batch_iterator_train=AugmentedBatchIterator(128, images, shuffle=True),
+    batch_iterator_test=AugmentedBatchIterator(128, images),
+    train_split=SliceSplit(eval_size=0.2),
     
     )
 
-def formatData(XDATA, yDATA = None):
-    # apply some very simple normalization to the data
-    XDATA -= XDATA.mean()
-    XDATA /= XDATA.std()
-
-    XDATA = XDATA.reshape(-1,1,38,38)
-
-    X_train = XDATA.astype(np.float32)
-    
-
-    y_train = yDATA.astype(np.int32)
-    
-
-    return X_train,y_train
-
-# Load the dataset
-print("Loading data...")
-
-XDATA = np.load('rotatedTrimedX.npz')['arr_0']
-yDATA = np.load('rotatedTrimedY.npz')['arr_0']
-
-#XDATA, yDATA = data_manager.load_all_images(True,True)
-#XDATA, yDATA = data_manager.load_transformed_images()
-X_train,y_train = formatData(XDATA,yDATA)
-
-print(X_train.shape)
-convnet.fit(X_train,y_train)
+print((len(images),) + images.image_shape)
+convnet.fit(samples, images.labels())
 
+# the saved net predicts on arrays of images, and the augmented iterators would also pickle their samples
+convnet.batch_iterator_train = BatchIterator(128)
+convnet.batch_iterator_test = BatchIterator(128)
 with open('./CNNMODELS/convnet.pickle', 'wb') as f:
     pickle.dump(convnet, f, -1)
 
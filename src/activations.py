@@ -0,0 +1,91 @@
+import numpy as np
+
+#every activation works on arrays whose rows are samples, with forward(x,out=None) from the layer's
+#activations, and derivative(y,out=None) from the layer's outputs y, so backpropagation never has to
+#evaluate the function again. out may be the very same array as x or y, and with out nothing is allocated
+
+class Tanh:
+    name="tanh"
+
+    def forward(self,x,out=None):
+        return np.tanh(x,out=out)
+
+    def derivative(self,y,out=None):
+        #1-tanh(x)**2
+        out=np.square(y,out=out)
+        return np.subtract(1.0,out,out=out)
+
+class Logistic:
+    name="logistic"
+
+    def forward(self,x,out=None):
+        out=np.negative(x,out=out)
+        np.exp(out,out=out)
+        out+=1.0
+        return np.reciprocal(out,out=out)
+
+    def derivative(self,y,out=None):
+        #y*(1-y), written as 0.25-(y-0.5)**2 so that out can be y
+        out=np.subtract(y,0.5,out=out)
+        np.square(out,out=out)
+        return np.subtract(0.25,out,out=out)
+
+class ReLU:
+    name="relu"
+
+    def forward(self,x,out=None):
+        return np.maximum(x,0.0,out=out)
+
+    def derivative(self,y,out=None):
+        #outputs are never negative, so their sign is 1 or 0. comparisons would allocate a bool array
+        return np.sign(y,out=out)
+
+class LeakyReLU:
+    #like ReLU, but negative activations are scaled by leak instead of cut to 0
+    name="leaky_relu"
+
+    def __init__(self,leak=0.01):
+        self.leak=leak
+
+    def forward(self,x,out=None):
+        if out is None or out is x:
+            return np.maximum(x,np.multiply(x,self.leak),out=out)
+        #x-(1-leak)*min(x,0), without a temporary array
+        np.minimum(x,0.0,out=out)
+        out*=self.leak-1.0
+        out+=x
+        return out
+
+    def derivative(self,y,out=None):
+        #1 for positive outputs and leak for negative ones, from their sign of 1 or -1
+        out=np.sign(y,out=out)
+        out*=(1.0-self.leak)/2
+        out+=(1.0+self.leak)/2
+        return out
+
+class Softmax:
+    #the exponentials of each row normalized to sum to 1. only for the last layer, where it goes with the
+    #cross-entropy error, whose correction is outputs-targets, so its derivative is never needed.
+    #NeuralNet.softmax_workspace is the same without allocating
+    name="softmax"
+
+    def forward(self,x,out=None):
+        e=np.exp(x-x.max(axis=1,keepdims=True))
+        e/=e.sum(axis=1,keepdims=True)
+        if out is None:
+            return e
+        np.copyto(out,e)
+        return out
+
+    def derivative(self,y,out=None):
+        raise ValueError("Softmax has no elementwise derivative, it can only be the output layer")
+
+ACTIVATIONS={activation.name:activation for activation in (Tanh,Logistic,ReLU,LeakyReLU,Softmax)}
+
+def get_activation(activation):
+    #takes the name of an activation, or an activation object, which is returned as is
+    if not isinstance(activation,str):
+        return activation
+    if activation not in ACTIVATIONS:
+        raise ValueError("Unknown activation '%s', pick one of %s"%(activation,", ".join(sorted(ACTIVATIONS))))
+    return ACTIVATIONS[activation]()
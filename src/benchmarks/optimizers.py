@@ -0,0 +1,75 @@
+"""
+Trials and seconds it takes each optimizer to reach a target training accuracy on the csvs in tests.
+Run from the src folder with python -m benchmarks.optimizers
+
+Usage:
+  optimizers.py [options]
+
+Options:
+    --optimizers=<names>   Optimizers to compare. [default: sgd,momentum,nesterov,adam]
+    --learn-rates=<lrs>    One learning rate per optimizer. [default: 0.1,0.01,0.01,0.01]
+    --target=<accuracy>    Stop training once the training accuracy reaches this. [default: 1.0]
+    --step=<trials>        Check the accuracy every this many trials. [default: 250]
+    --max-trials=<count>   Give up after this many trials. [default: 50000]
+    --seeds=<count>        Run every optimizer with this many seeds. [default: 5]
+    --hidden=<count>       Number of hidden neurons. [default: 10]
+    --batch=<size>         Mini-batch size. [default: 1]
+
+    -h --help              Show this screen.
+"""
+
+import glob, random, time
+import numpy as np
+from docopt import docopt
+from constants import *
+from utilities import *
+from neural_net import NeuralNet
+
+def trials_to_target(X,Y,sizes,optimizer,learn_rate,target,step,max_trials,batch_size):
+    #returns (trials, seconds) it took to reach target, trials is None if it never did
+    nn=NeuralNet(sizes,learning_rate=learn_rate,optimizer=optimizer)
+    seconds=0
+    trials=0
+    while trials<max_trials:
+        start_time=time.time()
+        nn.train(X,Y,step,batch_size=batch_size)
+        seconds+=time.time()-start_time
+        trials+=step
+        if nn.get_error_report("train",X,Y)["train accuracy"]>=target:
+            return trials,seconds
+    return None,seconds
+
+def main(args):
+    optimizers=args["--optimizers"].split(",")
+    learn_rates=[float(i) for i in args["--learn-rates"].split(",")]
+    if len(learn_rates)!=len(optimizers):
+        print_color("Need one learning rate per optimizer.",COLORS.RED)
+        return
+    target=float(args["--target"])
+    step=int(args["--step"])
+    max_trials=int(args["--max-trials"])
+    seeds=int(args["--seeds"])
+    hidden=int(args["--hidden"])
+    batch_size=int(args["--batch"])
+
+    for path in sorted(glob.glob("tests/*bools.csv")):
+        X,Y,a,b=get_data_1csv(path,1)
+        sizes=[len(X[0]),hidden,len(neuronize(Y)[0])]
+        print_color("%s %s"%(path,"-".join([str(i) for i in sizes])),COLORS.GREEN)
+        for optimizer,learn_rate in zip(optimizers,learn_rates):
+            results=[]
+            for seed in range(seeds):
+                random.seed(seed)
+                np.random.seed(seed)
+                results.append(trials_to_target(X,Y,sizes,optimizer,learn_rate,target,step,max_trials,batch_size))
+            reached=[r for r in results if r[0] is not None]
+            if reached:
+                text="%s/%s reached %s, mean %s trials, mean %s seconds"%(len(reached),seeds,target,
+                    round(np.mean([r[0] for r in reached])),round(np.mean([r[1] for r in reached]),3))
+            else:
+                text="0/%s reached %s in %s trials"%(seeds,target,max_trials)
+            print_color("    %s (lr %s): %s"%(optimizer,learn_rate,text),COLORS.YELLOW)
+
+if __name__ == "__main__":
+    args = docopt(__doc__)
+    main(args)
@@ -0,0 +1,156 @@
+"""
+Samples per second of forward, backward, mini_batch, train and evaluation, over a grid of layer sizes
+and batch sizes. Every measurement is repeated, and reported as a mean and standard deviation.
+Run from the src folder with python -m benchmarks.throughput
+
+Usage:
+  throughput.py [options]
+
+Options:
+    --sizes=<list>         Layer sizes to benchmark, separated by semicolons. [default: 2,2,1;64,32,10;784,128,10;2304,512,10]
+    --batches=<sizes>      Batch sizes for mini_batch and train. [default: 1,16,128]
+    --benchmarks=<names>   Which benchmarks to run. [default: forward,backward,mini_batch,train,evaluate]
+    --repeats=<count>      Repeat every measurement this many times. [default: 5]
+    --min-time=<seconds>   Every measurement runs for at least this long. [default: 0.2]
+    --rows=<count>         Rows of random data to train and evaluate on. [default: 1024]
+    --dtype=<dtype>        float32 or float64. [default: float64]
+    --output=<path>        Write the results to this json file.
+    --baseline=<path>      Compare against the results of an earlier --output, and exit with 1 on regressions.
+    --tolerance=<ratio>    With --baseline, being slower by more than this ratio is a regression. [default: 0.1]
+
+    -h --help              Show this screen.
+"""
+
+import json, platform, random, sys, time
+import numpy as np
+from docopt import docopt
+from constants import *
+from utilities import *
+from neural_net import NeuralNet
+
+BENCHMARKS=("forward","backward","mini_batch","train","evaluate")
+
+def measure(run,samples,repeats,min_time):
+    #run() handles samples samples. it is called often enough to take min_time per measurement, and
+    #returns the samples per second of every measurement
+    calls=1
+    start_time=time.perf_counter()
+    run()
+    elapsed=time.perf_counter()-start_time
+    if elapsed<min_time:
+        calls=int(min_time/max(elapsed,1e-9))+1
+
+    rates=[]
+    for r in range(repeats):
+        start_time=time.perf_counter()
+        for c in range(calls):
+            run()
+        rates.append(calls*samples/(time.perf_counter()-start_time))
+    return rates
+
+def get_runs(name,sizes,batch_size,rows,dtype):
+    #returns (run, samples per call) for one benchmark, on random data
+    nn=NeuralNet(sizes,learning_rate=0.001,dtype=dtype)
+    X=np.random.random((rows,sizes[0])).astype(dtype)
+    if sizes[-1]>1:
+        Y=np.random.randint(0,sizes[-1],rows)
+        targets=np.eye(sizes[-1],dtype=dtype)[Y]
+    else:
+        Y=np.random.randint(0,2,(rows,1))
+        targets=Y.astype(dtype)
+
+    if name=="forward":
+        return (lambda: nn.forward(X[0])),1
+    if name=="backward":
+        nn.forward(X[0])
+        return (lambda: nn.backward(targets[0])),1
+    if name=="mini_batch":
+        nn.get_workspace(batch_size)
+        indices=np.arange(batch_size)
+        return (lambda: nn.mini_batch(X,targets,indices,0.001)),batch_size
+    if name=="train":
+        return (lambda: nn.train(X,Y,rows,batch_size=batch_size)),rows
+    if name=="evaluate":
+        return (lambda: nn.predict(X)),rows
+    raise ValueError("Unknown benchmark '%s', pick one of %s"%(name,", ".join(BENCHMARKS)))
+
+def run_benchmarks(size_list,batch_sizes,names,repeats,min_time,rows,dtype):
+    #returns one result per benchmark, layer sizes and batch size. forward, backward and evaluate
+    #don't depend on the batch size, so they have a batch size of None
+    results=[]
+    for sizes in size_list:
+        for name in names:
+            for batch_size in (batch_sizes if name in ("mini_batch","train") else [None]):
+                run,samples=get_runs(name,sizes,batch_size,rows,dtype)
+                rates=measure(run,samples,repeats,min_time)
+                results.append({"name":name,"sizes":list(sizes),"batch size":batch_size,
+                        "samples per second":float(np.mean(rates)),"std":float(np.std(rates)),"runs":rates})
+                print_color("%s %s%s: %s samples/s (+-%s)"%(name,"-".join(str(i) for i in sizes),
+                        "" if batch_size is None else " batch %s"%batch_size,round(np.mean(rates)),
+                        round(np.std(rates))),COLORS.YELLOW)
+    return results
+
+def get_key(result):
+    return (result["name"],tuple(result["sizes"]),result["batch size"])
+
+def compare(results,baseline,tolerance):
+    #returns (key, ratio) for every result that is in baseline too, where ratio is new/old samples per
+    #second, and the ones of them slower by more than tolerance
+    old={get_key(result):result for result in baseline}
+    ratios=[]
+    for result in results:
+        key=get_key(result)
+        if key in old:
+            ratios.append((key,result["samples per second"]/old[key]["samples per second"]))
+    regressions=[(key,ratio) for key,ratio in ratios if ratio<1-tolerance]
+    return ratios,regressions
+
+def main(args):
+    try:
+        size_list=[[int(i) for i in sizes.split(",")] for sizes in args["--sizes"].split(";")]
+        batch_sizes=[int(i) for i in args["--batches"].split(",")]
+        repeats=int(args["--repeats"])
+        min_time=float(args["--min-time"])
+        rows=int(args["--rows"])
+        tolerance=float(args["--tolerance"])
+    except ValueError:
+        print_color("Bad value for a number option.",COLORS.RED)
+        return 1
+    names=args["--benchmarks"].split(",")
+    if any(name not in BENCHMARKS for name in names):
+        print_color("Bad value for benchmarks, pick from %s."%",".join(BENCHMARKS),COLORS.RED)
+        return 1
+
+    random.seed(123)
+    np.random.seed(123)
+    results=run_benchmarks(size_list,batch_sizes,names,repeats,min_time,rows,args["--dtype"])
+
+    if args["--output"]:
+        report={"python":platform.python_version(),
+                "numpy":np.__version__,
+                "machine":platform.machine(),
+                "dtype":args["--dtype"],
+                "time":time.strftime("%Y-%m-%d %H:%M:%S"),
+                "results":results}
+        with open(args["--output"],"w") as f:
+            json.dump(report,f,indent=1)
+        print_color("Wrote %s."%args["--output"],COLORS.GREEN)
+
+    if args["--baseline"]:
+        with open(args["--baseline"]) as f:
+            baseline=json.load(f)["results"]
+        ratios,regressions=compare(results,baseline,tolerance)
+        print_color("COMPARED TO %s"%args["--baseline"],COLORS.GREEN)
+        for (name,sizes,batch_size),ratio in ratios:
+            print_color("%s %s%s: x%s"%(name,"-".join(str(i) for i in sizes),
+                    "" if batch_size is None else " batch %s"%batch_size,round(ratio,3)),
+                    COLORS.RED if ratio<1-tolerance else COLORS.YELLOW)
+        if regressions:
+            print_color("%s regressions slower than the baseline by more than %s."%(len(regressions),tolerance),
+                    COLORS.RED)
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    args = docopt(__doc__)
+    sys.exit(main(args))
@@ -2,16 +2,38 @@ __author__ = "Charlie, Josh"
 
 from sklearn import datasets
 import numpy as np
-from scipy.ndimage.interpolation import rotate
-from scipy.misc import imfilter
+from scipy.ndimage import rotate
 from sklearn.utils import shuffle
-import itertools
+import multiprocessing
+from dataset import Dataset, DatasetWriter
+from disk_cache import DiskCache
 
 
 train_inputs1 = './data/train_inputs1.npz'
 train_inputs2 = './data/train_inputs2.npz'
 train_outputs = './data/train_outputs.npz'
 test_inputs = './data/test_inputs.npz'
+mnist_images = './data/mnist/mnist-images.npy'
+mnist_classes = './data/mnist/mnist-classes.npy'
+
+# the named image filters of PIL's ImageFilter, which scipy.misc.imfilter used:
+# (kernel size, scale, offset, kernel), the kernel row by row
+IMAGE_FILTERS = {
+    'blur': ((5, 5), 16, 0, (1, 1, 1, 1, 1, 1, 0, 0, 0, 1, 1, 0, 0, 0, 1, 1, 0, 0, 0, 1, 1, 1, 1, 1, 1)),
+    'contour': ((3, 3), 1, 255, (-1, -1, -1, -1, 8, -1, -1, -1, -1)),
+    'detail': ((3, 3), 6, 0, (0, -1, 0, -1, 10, -1, 0, -1, 0)),
+    'edge_enhance': ((3, 3), 2, 0, (-1, -1, -1, -1, 10, -1, -1, -1, -1)),
+    'edge_enhance_more': ((3, 3), 1, 0, (-1, -1, -1, -1, 9, -1, -1, -1, -1)),
+    'emboss': ((3, 3), 1, 128, (-1, 0, 0, 0, 1, 0, 0, 0, 0)),
+    'find_edges': ((3, 3), 1, 0, (-1, -1, -1, -1, 8, -1, -1, -1, -1)),
+    'smooth': ((3, 3), 13, 0, (1, 1, 1, 1, 5, 1, 1, 1, 1)),
+    'smooth_more': ((5, 5), 100, 0, (1, 1, 1, 1, 1, 1, 5, 5, 5, 1, 1, 5, 44, 5, 1, 1, 5, 5, 5, 1, 1, 1, 1, 1, 1)),
+    'sharpen': ((3, 3), 16, 0, (-2, -2, -2, -2, 32, -2, -2, -2, -2)),
+}
+
+# the loaders below keep their results on disk, so a new process memory-maps them instead of preprocessing
+# again. their results are read-only, copy them to change them
+data_cache = DiskCache()
 
 
 def memoize(func):
@@ -21,10 +43,11 @@ def memoize(func):
     """
     cache = {}
 
-    def wrapped(*args):
-        if args not in cache:
-            cache[args] = func(*args)
-        return cache[args]
+    def wrapped(*args, **kwargs):
+        key = (args, tuple(sorted(kwargs.items())))
+        if key not in cache:
+            cache[key] = func(*args, **kwargs)
+        return cache[key]
     return wrapped
 
 
@@ -57,25 +80,85 @@ def load_iris_data():
     return np.matrix(iris.data), np.array(iris.target)
 
 
-def load_all_images(rotate=False, trim=False):
+@data_cache.cached(sources=(train_inputs1, train_inputs2, train_outputs, mnist_images, mnist_classes), version=3)
+def load_all_images(rotate=False, trim=False, seed=0, edge=2):
     """
     Concatenates and shuffles images returned by load_raw_data, load_raw_mnist_images, and load_transformed_images
+    :param seed: the images are shuffled the same way for the same seed
+    :param edge: with trim, the number of pixels trimmed off every edge
     :return: all available images as np.array
     """
 
     mnist_imgs, mnist_clss = load_filtered_mnist_images()
     raw_imgs, raw_clss = load_raw_data()
+    if trim:
+        # trimming views first means only the trimmed pixels are ever copied
+        mnist_imgs = generate_trimmed_images(mnist_imgs, edge, edge, edge, edge)
+        raw_imgs = generate_trimmed_images(raw_imgs, edge, edge, edge, edge)
     imgs = np.vstack((raw_imgs, mnist_imgs))
     clss = np.concatenate((raw_clss,  mnist_clss))
-    imgs, clss = shuffle(imgs, clss)
-    if trim:
-        imgs = generate_trimmed_images(imgs)
+    imgs, clss = shuffle(imgs, clss, random_state=seed)
     if rotate:
         imgs, clss = generate_rotated_images(imgs, clss)
     return imgs, clss
 
 
-@memoize
+def save_all_images(folder, rotate=False, trim=False, chunk_size=1000, edge=2):
+    """
+    Writes the images of load_all_images to a memory-mapped dataset in folder, chunk_size images at a time,
+    so the trimmed and rotated copies of all images are never in memory at once
+    :param folder: the dataset folder, see dataset.py
+    :param chunk_size: number of source images rotated at a time
+    :param edge: with trim, the number of pixels trimmed off every edge
+    :return: the Dataset, whose images are shuffled like the ones of load_all_images
+    """
+    sources = [load_raw_data(), load_filtered_mnist_images()]
+    if trim:
+        # views of the sources, so only the trimmed pixels are read
+        sources = [(generate_trimmed_images(imgs, edge, edge, edge, edge), clss) for imgs, clss in sources]
+    first_count = len(sources[0][1])
+    count = first_count + len(sources[1][1])
+    order = np.random.permutation(count)
+
+    height, width = sources[0][0].shape[1:]
+    rotations = 4 if rotate else 1
+    writer = DatasetWriter(folder, count * rotations, (height, width))
+    for start in range(0, count, chunk_size):
+        indices = order[start:start + chunk_size]
+        imgs, clss = _gather_images(sources, first_count, indices)
+        if rotate:
+            imgs, clss = generate_rotated_images(imgs, clss)
+        writer.add(imgs, clss)
+    return writer.close()
+
+
+def _gather_images(sources, first_count, indices):
+    """
+    :param sources: the (images, classes) of two sources, as if they were concatenated
+    :param first_count: the number of images of the first source
+    :param indices: indices into the concatenated images
+    :return: tuple of the images and classes at indices
+    """
+    (imgs1, clss1), (imgs2, clss2) = sources
+    imgs = np.empty((len(indices),) + imgs1.shape[1:], dtype=np.result_type(imgs1, imgs2))
+    clss = np.empty(len(indices), dtype=np.result_type(clss1, clss2))
+    in_first = indices < first_count
+    imgs[in_first] = imgs1[indices[in_first]]
+    clss[in_first] = clss1[indices[in_first]]
+    imgs[~in_first] = imgs2[indices[~in_first] - first_count]
+    clss[~in_first] = clss2[indices[~in_first] - first_count]
+    return imgs, clss
+
+
+def load_dataset(folder):
+    """
+    :param folder: a dataset folder written by save_all_images
+    :return: the Dataset, whose X and Y are read-only memory maps
+    """
+    return Dataset(folder)
+
+
+@data_cache.cached(sources=(train_inputs1, train_inputs2, train_outputs))
 def load_raw_data():
     """
     Delegates to load_test_data
@@ -84,31 +167,102 @@ def load_raw_data():
     return np.reshape(imgs, (-1, 48, 48)), clss
 
 
-@memoize
 def load_raw_mnist_images():
     """
     :return: np.array of mnist images and np.array of mnist image classes
-    The images are in raw format
+    The images are in raw format, memory-mapped read-only
     """
-    imgs = np.load('./data/mnist/mnist-images.npy')
-    clss = np.load('./data/mnist/mnist-classes.npy')
+    imgs = np.load(mnist_images, mmap_mode='r')
+    clss = np.load(mnist_classes, mmap_mode='r')
     return imgs, clss
 
 
-def load_filtered_mnist_images():
+@data_cache.cached(sources=(mnist_images, mnist_classes), version=1, ignore=('processes',))
+def load_filtered_mnist_images(processes=1):
     """
-    :param *args: an option list
+    :param processes: number of processes filtering parts of the images at once
     :return: np.array of mnist images and np.array of mnist image classes
     The images are returned filtered by several image filters. Any filters
-    that can be used with scipy.misc.imfilter may be used.
+    in IMAGE_FILTERS may be used.
     """
     filters = ['emboss', 'blur']
     imgs, clss = load_raw_mnist_images()
-    for index, img in enumerate(imgs):
-        for filter in filters:
-            img = imfilter(img, filter)
-        imgs[index,:,:] = img
-    return imgs, clss
+    return filter_images(imgs, filters, processes).astype(imgs.dtype, copy=False), np.array(clss)
+
+
+def filter_images(images, filters, processes=1):
+    """
+    Filters a whole stack of images at once, the same way scipy.misc.imfilter filtered them one at a time
+    :param images: 3d numpy array (n x height x width). images that aren't uint8 are scaled to 0-255 first,
+    every image from its own minimum to its own maximum
+    :param filters: names of IMAGE_FILTERS, applied one after the other
+    :param processes: with more than one, the images are split between a pool of processes
+    :return: 3d uint8 numpy array of the filtered images
+    """
+    images = _bytescale(images)
+    if processes > 1 and len(images) > 1:
+        chunks = np.array_split(images, processes)
+        with multiprocessing.Pool(processes) as pool:
+            return np.concatenate(pool.starmap(filter_images, [(chunk, filters) for chunk in chunks]))
+    for filter in filters:
+        images = _filter_stack(images, filter)
+    return images
+
+
+def _bytescale(images):
+    """
+    :return: uint8 images as they are, others scaled to 0-255 like scipy.misc.bytescale scaled every image
+    """
+    if images.dtype == np.uint8:
+        return images
+    # bytescale computed in the images' own float type, so float32 images round the same way
+    images = np.asarray(images, dtype=images.dtype if images.dtype.kind == 'f' else np.float64)
+    low = images.min(axis=(1, 2), keepdims=True)
+    scale = images.max(axis=(1, 2), keepdims=True) - low
+    scale[scale == 0] = 1
+    scaled = (images - low) * (255 / scale).astype(images.dtype)
+    return (scaled.clip(0, 255) + 0.5).astype(np.uint8)
+
+
+def _filter_stack(images, filter):
+    """
+    :param images: 3d uint8 numpy array
+    :return: the images filtered by one of IMAGE_FILTERS. like PIL, the pixels closer to the edge than half
+    the kernel size are left alone, and the kernel's rows are applied from the bottom row up. sums exactly
+    halfway between two values round up, which newer PIL versions don't always do for kernels whose scale
+    isn't a power of two, like 'detail'
+    """
+    (height, width), scale, offset, kernel = IMAGE_FILTERS[filter]
+    kernel = np.reshape(kernel, (height, width))[::-1, :]
+    filtered = np.array(images, dtype=np.uint8)
+    count, rows, columns = images.shape
+    if rows < height or columns < width:
+        return filtered
+    # the kernels are small and made of integers, so the weighted sums are exact in int16, one shifted slice
+    # per nonzero weight. a few hundred images at a time stay in the cpu cache between the slices
+    inner_rows, inner_columns = rows - height + 1, columns - width + 1
+    weights = [(y, x, int(weight)) for (y, x), weight in np.ndenumerate(kernel) if weight]
+    chunk_size = 256
+    sums = np.empty((min(count, chunk_size), inner_rows, inner_columns), dtype=np.int16)
+    term = np.empty_like(sums)
+    for start in range(0, count, chunk_size):
+        chunk = images[start:start + chunk_size]
+        chunk_sums, chunk_term = sums[:len(chunk)], term[:len(chunk)]
+        chunk_sums[...] = 0
+        for y, x, weight in weights:
+            part = chunk[:, y:y + inner_rows, x:x + inner_columns]
+            if weight == 1:
+                np.add(chunk_sums, part, out=chunk_sums)
+            elif weight == -1:
+                np.subtract(chunk_sums, part, out=chunk_sums)
+            else:
+                np.multiply(part, weight, out=chunk_term, dtype=np.int16)
+                chunk_sums += chunk_term
+        # sums/scale+offset, rounded half up and clipped to 0-255 like PIL
+        values = (2 * (chunk_sums.astype(np.int32) + scale * offset) + scale) // (2 * scale)
+        filtered[start:start + len(chunk), height // 2:height // 2 + inner_rows,
+                 width // 2:width // 2 + inner_columns] = np.clip(values, 0, 255)
+    return filtered
 
 
 def load_rotated_images():
@@ -119,6 +273,7 @@ def load_rotated_images():
     return generate_rotated_images(imgs, clss)
 
 
+@data_cache.cached(sources=(train_inputs1, train_inputs2, train_outputs), version=2)
 def load_transformed_images(rotated=True, trimmed=True):
     """
     :param rotated: boolean. if true, will generate rotated images
@@ -133,54 +288,203 @@ def load_transformed_images(rotated=True, trimmed=True):
     return imgs, clss
 
 
-def generate_rotated_images(images, classes):
+def generate_rotated_images(images, classes, num_rotations=4, processes=1, chunk_size=1000):
     """
     :param images: 3d array of numpy array images (n x 48 x 48)
     :param classes: 1d array of image classifications
-    :return: tuple np.array of rotated images
+    :param num_rotations: every image is rotated this many times by 360/num_rotations degrees, the first time
+    by 0 degrees. right angles just move pixels around, other angles are interpolated
+    :param processes: number of processes interpolating chunk_size images at a time, for other than right angles
+    :return: tuple np.array of rotated images, the rotations of an image next to each other, and their classes
+    """
+    images = np.asarray(images)
+    angle = 360 / num_rotations
+    if angle % 90 == 0:
+        _check_rotation(images.shape[1:], angle)
+        rotated_images = np.empty((len(images), num_rotations) + images.shape[1:], dtype=images.dtype)
+        for index in range(num_rotations):
+            rotated_images[:, index] = _rotate_stack(images, index * angle)
+    else:
+        angles = [index * angle for index in range(num_rotations)]
+        chunks = [(images[start:start + chunk_size], angles) for start in range(0, len(images), chunk_size)]
+        if processes > 1 and len(chunks) > 1:
+            with multiprocessing.Pool(processes) as pool:
+                rotated_chunks = pool.starmap(_rotate_chunk, chunks)
+        else:
+            rotated_chunks = [_rotate_chunk(*chunk) for chunk in chunks]
+        rotated_images = np.empty((len(images), num_rotations) + images.shape[1:])
+        for start, rotated_chunk in zip(range(0, len(images), chunk_size), rotated_chunks):
+            rotated_images[start:start + len(rotated_chunk)] = rotated_chunk
+    return rotated_images.reshape((-1,) + images.shape[1:]), np.repeat(classes, num_rotations)
+
+
+def _rotate_chunk(images, angles):
+    """
+    :param images: 3d numpy array of images
+    :param angles: angles in degrees, counterclockwise
+    :return: 4d numpy array (n x angles x height x width) of the images rotated by every angle, the corners
+    that come from outside an image are 0
     """
-    num_rotations = 4
-    rotated_images = []
-    for index, img in enumerate(images):
-        rotated_images.append(_rotations(img, num_rotations))
-    return np.vstack(tuple(rotated_images)), np.repeat(classes, num_rotations)
+    rotated_images = np.empty((len(images), len(angles)) + images.shape[1:])
+    for index, angle in enumerate(angles):
+        rotated_images[:, index] = _rotate_stack(images, angle)
+    return rotated_images
 
 
-def generate_trimmed_images(images, edge_top=2, edge_left=2, edge_bottom=2, edge_right=2):
+def _rotate_stack(images, angle):
     """
-    :param images: 3d numpy array with dimension (n, 48, 48)
-    :return: numpy array with dimension (n, (48-edge_left-edge_right), (48-edge_top-edge_bottom))
-    where the edges of image have been removed
+    :param images: 3d numpy array of images
+    :param angle: in degrees, counterclockwise
+    :return: the images rotated by angle, a view for right angles and interpolated for others
     """
-    trimmed_images = []
-    for index, img in enumerate(images):
-        trimmed_images.append(trim_edges(img, edge_top, edge_left, edge_bottom, edge_right))
-    return np.vstack(tuple(trimmed_images))
+    if angle % 90 == 0:
+        return np.rot90(images, int(angle) // 90, axes=(1, 2))
+    return rotate(images, angle, axes=(2, 1), reshape=False)
+
+
+def _check_rotation(shape, angle):
+    if angle % 180 and shape[0] != shape[1]:
+        raise ValueError("can't rotate %sx%s images by %s degrees in place" % (shape[0], shape[1], angle))
 
 
-def _rotations(image, num_rotations):
+def generate_trimmed_images(images, edge_top=2, edge_left=2, edge_bottom=2, edge_right=2, copy=False):
     """
-    :param image:
-    :return: array of rotated images
+    :param images: 3d numpy array with dimension (n, 48, 48)
+    :param copy: if true, returns a contiguous copy instead of a view
+    :return: numpy array with dimension (n, (48-edge_top-edge_bottom), (48-edge_left-edge_right))
+    where the edges of image have been removed. without copy it is a view of images, which shares
+    their memory, so making it takes no time and no memory whatever the size of images
     """
-    angle = 360 / num_rotations
-    rotations = np.empty((num_rotations, image.shape[0], image.shape[1]))
-    rotated_image = image
-    for i in range(num_rotations):
-        rotations[i] = rotated_image
-        rotated_image = rotate(rotated_image, angle)
-    return rotations
+    height, width = images.shape[1:]
+    trimmed_images = images[:, edge_top:height - edge_bottom, edge_left:width - edge_right]
+    return np.ascontiguousarray(trimmed_images) if copy else trimmed_images
 
 
 def trim_edges(image, edge_top=2, edge_left=2, edge_bottom=2, edge_right=2):
-    rows, columns = _edges(image.shape, edge_top, edge_left, edge_bottom, edge_right)
-    return np.delete(np.delete(image, rows, 0), columns, 1)
+    """
+    :param image: 2d numpy array
+    :return: a view of image without its edges
+    """
+    return generate_trimmed_images(image[np.newaxis], edge_top, edge_left, edge_bottom, edge_right)[0]
 
 
-@memoize
-def _edges(shape, edge_top, edge_left, edge_bottom, edge_right):
-    height, width = shape
-    rows = [i for i in itertools.chain(range(edge_top), range(height-edge_bottom, height))]
-    columns = [i for i in itertools.chain(range(edge_left), range(width-edge_right, width))]
-    return rows, columns
+class AugmentedImages(object):
+    """
+    The rotated, trimmed and filtered versions of base images, made a batch at a time when they are read,
+    so only the base images are ever in memory, and they can be a memory map.
+    Without random, sample i is base image i // rotations rotated by i % rotations times 360/rotations
+    degrees, in the same order as generate_rotated_images. With random, there is one sample per base
+    image, and every time it is read it gets a random rotation, and with shift a random crop instead of
+    the centered one. the random numbers come from an RNG seeded with seed, so reading the same batches
+    in the same order gives the same samples, and every epoch sees new ones.
+    NeuralNet.train, predict and get_accuracy read the samples as rows with get_rows, so this can be the
+    training data and the validation data, and a batch iterator reads them with get_batch.
+    """
 
+    def __init__(self, images, classes, rotations=4, edge=2, filters=(), random=False, shift=False, seed=0,
+                 mean=0.0, std=1.0, dtype=np.float32):
+        """
+        :param images: 3d numpy array (n x height x width) of the base images
+        :param classes: 1d array of their classes
+        :param edge: number of pixels trimmed off every edge
+        :param filters: names of IMAGE_FILTERS applied to the images before they are trimmed and rotated
+        :param mean: subtracted from the samples
+        :param std: the samples are divided by it
+        """
+        self.images = images
+        self.classes = np.asarray(classes)
+        self.rotations = rotations
+        self.edge = edge
+        self.filters = list(filters)
+        self.random = random
+        self.shift = shift
+        self.seed = seed
+        self.mean, self.std = mean, std
+        self.dtype = np.dtype(dtype)
+        self.image_shape = (images.shape[1] - 2 * edge, images.shape[2] - 2 * edge)
+        for index in range(rotations):
+            _check_rotation(self.image_shape, index * 360 / rotations)
+        # like a 2d array with one row per sample, for NeuralNet.train
+        self.shape = (len(self), self.image_shape[0] * self.image_shape[1])
+        self.reset()
+
+    def reset(self):
+        """
+        Starts the random samples over
+        """
+        self.rng = np.random.RandomState(self.seed)
+
+    def __getstate__(self):
+        """
+        Pickles the settings without the images and classes, so pickling a model that holds this doesn't
+        write the whole data set. Set images and classes again to read samples after unpickling
+        """
+        state = self.__dict__.copy()
+        state['images'] = state['classes'] = None
+        return state
+
+    def __len__(self):
+        return len(self.images) * (1 if self.random else self.rotations)
+
+    def labels(self):
+        """
+        :return: the class of every sample
+        """
+        return self.classes if self.random else np.repeat(self.classes, self.rotations)
+
+    def get_batch(self, indices):
+        """
+        :param indices: 1d array of sample indices
+        :return: tuple of 3d numpy array of the samples at indices and 1d array of their classes
+        """
+        indices = np.asarray(indices)
+        if self.random:
+            sources, turns = indices, self.rng.randint(self.rotations, size=len(indices))
+        else:
+            sources, turns = np.divmod(indices, self.rotations)
+        images = self.images[sources]
+        if self.filters:
+            images = filter_images(images, self.filters)
+        images = self._trim(images)
+
+        batch = np.empty((len(indices),) + self.image_shape, dtype=self.dtype)
+        for turn in np.unique(turns):
+            chosen = turns == turn
+            batch[chosen] = _rotate_stack(images[chosen], turn * 360 / self.rotations)
+        batch -= self.mean
+        batch /= self.std
+        return batch, self.classes[sources]
+
+    def get_rows(self, indices):
+        """
+        :return: the samples at indices with one row per sample, the way NeuralNet takes them
+        """
+        batch, classes = self.get_batch(indices)
+        return batch.reshape(len(batch), -1)
+
+    def _trim(self, images):
+        if not (self.random and self.shift and self.edge):
+            return generate_trimmed_images(images, self.edge, self.edge, self.edge, self.edge)
+        # a random crop per image, anywhere from the top left to the bottom right corner
+        height, width = self.image_shape
+        tops, lefts = self.rng.randint(2 * self.edge + 1, size=(2, len(images)))
+        rows = tops[:, np.newaxis, np.newaxis] + np.arange(height)[:, np.newaxis]
+        columns = lefts[:, np.newaxis, np.newaxis] + np.arange(width)
+        return images[np.arange(len(images))[:, np.newaxis, np.newaxis], rows, columns]
+
+    def get_stats(self, chunk_size=1000):
+        """
+        :return: the mean and standard deviation of the filtered and trimmed base images, which rotating
+        doesn't change, counted chunk_size images at a time
+        """
+        total, squares, count = 0.0, 0.0, 0
+        for start in range(0, len(self.images), chunk_size):
+            images = self.images[start:start + chunk_size]
+            if self.filters:
+                images = filter_images(images, self.filters)
+            images = generate_trimmed_images(images, self.edge, self.edge, self.edge, self.edge)
+            total += float(np.sum(images, dtype=np.float64))
+            squares += float(np.sum(np.square(images, dtype=np.float64)))
+            count += images.size
+        mean = total / count
+        return mean, max(squares / count - mean * mean, 0.0) ** 0.5
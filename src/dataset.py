@@ -0,0 +1,76 @@
+import os, json
+import numpy as np
+from numpy.lib.format import open_memmap
+
+#a dataset is a folder with X.npy, Y.npy and info.json. X and Y are opened as read-only memory maps, so
+#only the pages of the rows a batch uses are read, and peak memory is set by the batch size rather than
+#by the size of the dataset. info.json has the number of rows and the mean and std of X, counted while
+#the dataset was written, so batches can be normalized without a pass over the whole dataset.
+#NeuralNet.train, predict and get_accuracy take a Dataset as X, and read normalized rows with get_rows
+
+class Dataset:
+    def __init__(self,folder):
+        self.folder=folder
+        with open(os.path.join(folder,"info.json")) as f:
+            info=json.load(f)
+        self.mean=info["mean"]
+        self.std=info["std"]
+        self.X=np.load(os.path.join(folder,"X.npy"),mmap_mode="r")
+        self.Y=np.load(os.path.join(folder,"Y.npy"),mmap_mode="r")
+        #like a 2d array with one row per sample, for NeuralNet.train
+        self.shape=(len(self.X),int(np.prod(self.X.shape[1:])))
+
+    def __len__(self):
+        return len(self.X)
+
+    def rows(self):
+        #X with one row per sample, not normalized. a view of the memory map
+        return self.X.reshape(self.shape)
+
+    def get_rows(self,indices):
+        #the rows at indices, normalized with the mean and std of info.json. only these rows are read
+        rows=self.X[indices].reshape(len(indices),-1)
+        rows-=self.mean
+        rows/=self.std or 1.0
+        return rows
+
+    def labels(self):
+        #Y as a column of labels, Y=[[2],[0],[1]...]. a view of the memory map
+        return self.Y.reshape(len(self.Y),-1)
+
+class DatasetWriter:
+    #writes a dataset of row_count samples of sample_shape, a chunk of rows at a time with add.
+    #close writes info.json last, so a dataset that was not written completely can't be opened
+    def __init__(self,folder,row_count,sample_shape,dtype=np.float32):
+        os.makedirs(folder,exist_ok=True)
+        self.folder=folder
+        self.X=open_memmap(os.path.join(folder,"X.npy"),mode="w+",dtype=dtype,
+                shape=(row_count,)+tuple(sample_shape))
+        self.Y=open_memmap(os.path.join(folder,"Y.npy"),mode="w+",dtype=np.int32,shape=(row_count,))
+        self.position=0
+        self.total=0.0
+        self.squares=0.0
+
+    def add(self,X,Y):
+        count=len(X)
+        if self.position+count>len(self.X):
+            raise ValueError("DatasetWriter got more than the %s rows it was made for"%len(self.X))
+        self.X[self.position:self.position+count]=X
+        self.Y[self.position:self.position+count]=Y
+        self.total+=float(np.sum(X,dtype=np.float64))
+        self.squares+=float(np.sum(np.square(X,dtype=np.float64)))
+        self.position+=count
+
+    def close(self):
+        #returns the finished Dataset
+        if self.position!=len(self.X):
+            raise ValueError("DatasetWriter got %s rows, but was made for %s"%(self.position,len(self.X)))
+        self.X.flush()
+        self.Y.flush()
+        size=max(self.X.size,1)
+        mean=self.total/size
+        std=np.sqrt(max(self.squares/size-mean**2,0.0))
+        self.X=self.Y=None
+        with open(os.path.join(self.folder,"info.json"),"w") as f:
+            json.dump({"rows":self.position,"mean":mean,"std":float(std)},f)
+        return Dataset(self.folder)
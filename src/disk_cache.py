@@ -0,0 +1,144 @@
+import functools
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+
+
+DEFAULT_FOLDER = './data/cache'
+DEFAULT_MAX_BYTES = 8 * 1024 ** 3
+
+
+class DiskCache(object):
+    """
+    Keeps the arrays returned by functions as .npy files in folder, one subfolder per call. A call is keyed
+    by the function, its arguments after defaults are applied, and the size and modification time of its
+    source files, so changing a source file or an argument recomputes the result. Cached results are
+    returned as read-only memory maps, so every caller and every process shares the same pages, and nobody
+    can change them for the others.
+    Once the cache holds more than max_bytes, the least recently used results are deleted.
+    """
+
+    def __init__(self, folder=DEFAULT_FOLDER, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        :param folder: where the results are kept, made if it doesn't exist
+        :param max_bytes: the cache is trimmed to this size after every new result
+        """
+        self.folder = folder
+        self.max_bytes = max_bytes
+
+    def get_key(self, func, args, kwargs, sources=(), version=0, ignore=()):
+        """
+        :param ignore: names of arguments that don't change the result
+        :return: a hex digest that changes with the function, its arguments, its version and its sources
+        """
+        bound = inspect.signature(func).bind(*args, **kwargs)
+        bound.apply_defaults()
+        for name in ignore:
+            bound.arguments.pop(name, None)
+        files = []
+        for path in sources:
+            stat = os.stat(path)
+            files.append([os.path.abspath(path), stat.st_size, stat.st_mtime_ns])
+        key = [func.__module__, func.__qualname__, version, sorted((name, repr(value))
+               for name, value in bound.arguments.items()), files]
+        return hashlib.sha256(json.dumps(key).encode()).hexdigest()
+
+    def get(self, key):
+        """
+        :return: the result stored under key, or None if there is none
+        """
+        path = os.path.join(self.folder, key)
+        try:
+            with open(os.path.join(path, 'result.json')) as f:
+                info = json.load(f)
+            arrays = [np.load(os.path.join(path, '%s.npy' % i), mmap_mode='r') for i in range(info['count'])]
+        except (OSError, ValueError):
+            return None
+        # the folder's modification time is when it was last used, for the eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return tuple(arrays) if info['tuple'] else arrays[0]
+
+    def put(self, key, result):
+        """
+        Stores result, an array or a tuple of arrays, under key
+        :return: the stored result, as read-only memory maps
+        """
+        os.makedirs(self.folder, exist_ok=True)
+        arrays = result if isinstance(result, tuple) else (result,)
+        # written to a temporary folder and renamed, so other processes never see half a result
+        temporary = tempfile.mkdtemp(dir=self.folder, prefix='.tmp-')
+        try:
+            for i, array in enumerate(arrays):
+                np.save(os.path.join(temporary, '%s.npy' % i), np.asarray(array))
+            with open(os.path.join(temporary, 'result.json'), 'w') as f:
+                json.dump({'count': len(arrays), 'tuple': isinstance(result, tuple)}, f)
+            os.rename(temporary, os.path.join(self.folder, key))
+        except OSError:
+            # another process stored the same key first
+            shutil.rmtree(temporary, ignore_errors=True)
+        self.evict(keep=key)
+        return self.get(key)
+
+    def get_entries(self):
+        """
+        :return: list of (last use, bytes, path) of every stored result
+        """
+        entries = []
+        if not os.path.isdir(self.folder):
+            return entries
+        for name in os.listdir(self.folder):
+            path = os.path.join(self.folder, name)
+            if name.startswith('.') or not os.path.isdir(path):
+                continue
+            try:
+                size = sum(os.path.getsize(os.path.join(path, file)) for file in os.listdir(path))
+                entries.append((os.path.getmtime(path), size, path))
+            except OSError:
+                # evicted by another process meanwhile
+                pass
+        return entries
+
+    def evict(self, keep=None):
+        """
+        Deletes the least recently used results until the cache fits in max_bytes
+        :param keep: key of a result that is never deleted, the one just stored
+        """
+        entries = sorted(self.get_entries())
+        total = sum(size for last_use, size, path in entries)
+        for last_use, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if os.path.basename(path) == keep:
+                continue
+            # memory maps that are still open keep working, the files only disappear from the folder
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def cached(self, sources=(), version=0, ignore=()):
+        """
+        Decorator for functions that return an array or a tuple of arrays
+        :param sources: paths of the files the function reads
+        :param version: bump it when the function computes something else, to ignore the old results
+        :param ignore: names of arguments that don't change the result, like a number of processes
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapped(*args, **kwargs):
+                key = self.get_key(func, args, kwargs, sources, version, ignore)
+                result = self.get(key)
+                if result is None:
+                    result = self.put(key, func(*args, **kwargs))
+                return result
+            wrapped.uncached = func
+            return wrapped
+        return decorator
@@ -4,21 +4,38 @@ COMP598 Project 3 Neural Network
 Usage:
   main.py <train-csv> <prediction-csv> [<target-csv>] [options]
 
+Predictions for <target-csv> are written to results/results-NNN.csv, with the Id of every row.
+
 Options:
     --trials=<count>       Backpropagate this many times [default: 10000]
     --learn-rate=<lr>      Set learning rate to this [default: 0.1]
     --final-learn-rate=<lr>      Gradually approach this learning rate throughout the trials linearly. -1 means no change. [default: -1]
+    --optimizer=<name>     How adjustments change the weights: sgd, momentum, nesterov or adam. [default: sgd]
     --batch=<size>         Use mini-batches of this size to speed up training. [default: 1]
+    --workers=<count>      Train with this many processes at once, Hogwild style, on shared weights. [default: 1]
+    --sync                 With --workers, split every mini-batch across the processes and add up their adjustments instead. Reproducible, unlike Hogwild.
+    --scaling              Instead of training once, report the samples per second for 1 to --workers processes.
     --normalize            Subtract the mean and divide by the standard deviation for all of X.
     --random               Do not use seed, make trials actually random each time.
     --timer=<interval>     Wait this many seconds before printing an update during big jobs. [default: 10]
-    --logging              Writes the weights, outputs, etc to csvs in the logs folder for every backpropagation step.
+    --logging              Records the weights, outputs, etc in binary ring buffers in the logs folder during training, see training_log.read_log.
+    --log-interval=<count>  With --logging, record every this many backpropagation steps. [default: 1]
+    --save=<path>          Write the trained net to this model file.
+    --load=<path>          Load the net from a model file written by --save instead of training one. Its sizes replace --sizes.
     --report               Appends to a report csv with the hyperparameters and the accuracy for this trial.
+    --profile              Time loading, training (forward, backward, adjust...), evaluation and logging, print a summary, and write a Chrome trace to logs/trace.json.
 
     --validate
+    --early-stop           Check the validation accuracy during training, stop once it stops improving and keep the best weights. Only with one worker.
+    --eval-interval=<count>  With --early-stop, check the validation accuracy every this many trials. [default: 1000]
+    --patience=<count>     With --early-stop, stop after this many checks in a row without improvement. [default: 5]
+    --min-improvement=<a>  With --early-stop, accuracy gains this small or smaller do not count as improvement. [default: 0]
     --validation-ratio=<r>  Number from 0 to 1. 0.8 means 80% of data is used for training, 20% for validation. If value is 1 and --validate is specified, then training=validation for basic testing purposes [default: 0.8]
 
     --sizes=<sizes>        Describes the number of nodes per layer: input, hidden(s), and output. [default: 2,2,1]
+    --dtype=<dtype>        Precision of the weights and of all the math: float32 or float64. [default: float64]
+    --activation=<names>   Activation of the hidden layers: tanh, logistic, relu or leaky_relu. A comma separated list sets one per hidden layer. [default: tanh]
+    --output=<name>        Activation of the output layer, with squared error, or softmax with cross-entropy. [default: tanh]
 
     --verbose
 
@@ -32,6 +49,10 @@ from docopt import docopt
 from constants import *
 from utilities import *
 from neural_net import NeuralNet
+from optimizers import OPTIMIZERS
+from activations import ACTIVATIONS
+from parallel import train_hogwild, train_data_parallel, hogwild_scaling
+from profiler import PROFILER
 
 def get_csv_path():
     #scans all existing data csvs, returns the name with the lowest number suffix that is unused
@@ -52,6 +73,19 @@ def is_file(path):
         return 0
     return 1
 
+def train(nn,args,X_train,Y_train,X_valid,Y_valid,trials,batch_size,workers,eval_interval,patience,min_improvement):
+    if workers>1 and args["--sync"]:
+        throughput=train_data_parallel(nn,X_train,Y_train,trials,workers,batch_size)
+        print_color("Trained %s samples per second on %s workers."%(round(throughput),workers),COLORS.GREEN)
+    elif workers>1:
+        throughput=train_hogwild(nn,X_train,Y_train,trials,workers,batch_size=batch_size)
+        print_color("Trained %s samples per second on %s workers."%(round(throughput),workers),COLORS.GREEN)
+    elif args["--early-stop"]:
+        nn.train(X_train,Y_train,trials,batch_size=batch_size,valid_X=X_valid,valid_Y=Y_valid,
+                eval_interval=eval_interval,patience=patience,min_improvement=min_improvement)
+    else:
+        nn.train(X_train,Y_train,trials,batch_size=batch_size)
+
 def main(args):
     if not args["--random"]:
         random.seed(123)
@@ -81,6 +115,12 @@ def main(args):
         print_color("Bad value for batch.",COLORS.RED)
         return
 
+    try:
+        workers=int(args["--workers"])
+    except ValueError:
+        print_color("Bad value for workers.",COLORS.RED)
+        return
+
     try:
         learn_rate=float(args["--learn-rate"])
     except ValueError:
@@ -105,29 +145,101 @@ def main(args):
         print_color("Bad value for sizes.",COLORS.RED)
         return
 
+    try:
+        eval_interval=int(args["--eval-interval"])
+        patience=int(args["--patience"])
+        min_improvement=float(args["--min-improvement"])
+    except ValueError:
+        print_color("Bad value for early stopping.",COLORS.RED)
+        return
+    if args["--early-stop"] and workers>1:
+        #the processes train on their own, nothing checks the validation accuracy between them
+        print_color("--early-stop only works with one worker, leave out --workers.",COLORS.RED)
+        return
+
+    try:
+        log_interval=int(args["--log-interval"])
+    except ValueError:
+        print_color("Bad value for log interval.",COLORS.RED)
+        return
+
     try:
         validation_ratio=float(args["--validation-ratio"])
     except ValueError:
         print_color("Bad value for validation ratio.",COLORS.RED)
         return
 
+    optimizer=args["--optimizer"]
+    if optimizer not in OPTIMIZERS:
+        print_color("Bad value for optimizer.",COLORS.RED)
+        return
+
+    dtype=args["--dtype"]
+    if dtype not in ("float32","float64"):
+        print_color("Bad value for dtype.",COLORS.RED)
+        return
+
+    output=args["--output"]
+    if output not in ACTIVATIONS:
+        print_color("Bad value for output.",COLORS.RED)
+        return
+
+    activation=args["--activation"].split(",")
+    if len(activation)==1:
+        activation=activation[0]
+    elif len(activation)!=len(sizes)-2:
+        print_color("Bad value for activation, it needs one per hidden layer.",COLORS.RED)
+        return
+    if any(a not in ACTIVATIONS or a=="softmax" for a in args["--activation"].split(",")):
+        print_color("Bad value for activation.",COLORS.RED)
+        return
+
+    nn=None
+    if args["--load"]:
+        if not is_file(args["--load"]):
+            return
+        nn=NeuralNet.load(args["--load"],verbose=args["--verbose"],timer_interval=interval)
+        sizes=nn.sizes
+
     print_color("Opening file: %s"%train_csv,COLORS.YELLOW)
 
-    X_train,Y_train,X_valid,Y_valid=get_data_2csv(train_csv,prediction_csv,
-            validation_ratio,normalize=args["--normalize"])
+    if args["--profile"]:
+        PROFILER.enable()
+    with PROFILER.span("load"):
+        X_train,Y_train,X_valid,Y_valid,(mean,std)=get_data_2csv(train_csv,prediction_csv,
+                validation_ratio,normalize=args["--normalize"],return_stats=True)
     if validation_ratio==1 and args["--validate"]:
         X_valid,Y_valid=X_train,Y_train
 
+    if args["--early-stop"] and not len(X_valid):
+        print_color("Early stopping needs a validation set, lower the validation ratio.",COLORS.RED)
+        return
+
     if sizes[0]!=len(X_train[0]):
         print_color("Bad 'sizes' parameter for this input data. sizes[0]=%s len(X[0])=%s"%(sizes[0],len(X_train[0])),COLORS.RED)
         return
 
+    if args["--scaling"]:
+        hogwild_scaling(X_train,Y_train,sizes,trials,range(1,workers+1),batch_size=batch_size,
+                learning_rate=learn_rate,final_learning_rate=final_learn_rate,dtype=dtype,optimizer=optimizer,
+                activation=activation,output=output)
+        return
+
     start_time=time.time()
-    print_color("Initializing neural net.",COLORS.GREEN)
-    nn=NeuralNet(sizes,learning_rate=learn_rate,final_learning_rate=final_learn_rate,
-            verbose=args["--verbose"],timer_interval=interval,
-            logging=args["--logging"])
-    nn.train(X_train,Y_train,trials,batch_size=batch_size)
+    if args["--load"]:
+        print_color("Loaded neural net from %s."%args["--load"],COLORS.GREEN)
+    else:
+        print_color("Initializing neural net.",COLORS.GREEN)
+        nn=NeuralNet(sizes,learning_rate=learn_rate,final_learning_rate=final_learn_rate,
+                verbose=args["--verbose"],timer_interval=interval,
+                logging=args["--logging"],log_interval=log_interval,dtype=dtype,optimizer=optimizer,
+                activation=activation,output=output)
+        train(nn,args,X_train,Y_train,X_valid,Y_valid,trials,batch_size,workers,
+                eval_interval,patience,min_improvement)
+
+    if args["--save"]:
+        nn.save(args["--save"])
+        print_color("Saved neural net to %s."%args["--save"],COLORS.GREEN)
 
     report=0
     if args["--validate"]:
@@ -142,11 +254,16 @@ def main(args):
         report["duration"]=time.time()-start_time
         save_report(report)
     if target:
-        raise NotImplementedError
-        print_color("Making predictions.",COLORS.GREEN)
-        nn.make_predictions_csv(target)
+        predictions_csv=get_csv_path()
+        print_color("Making predictions into %s."%predictions_csv,COLORS.GREEN)
+        count=nn.make_predictions_csv(target,predictions_csv,mean=mean,std=std)
+        print_color("Wrote %s predictions."%count,COLORS.GREEN)
 
     print_color("Done after %s seconds."%round(time.time()-start_time,1),COLORS.GREEN)
+    if args["--profile"]:
+        PROFILER.report()
+        PROFILER.write_trace(LOGFOLDER+"trace.json")
+        print_color("Wrote a Chrome trace to %strace.json."%LOGFOLDER,COLORS.GREEN)
 
 if __name__ == "__main__":
     args = docopt(__doc__, version="1.0")
@@ -0,0 +1,67 @@
+import json, struct
+import numpy as np
+
+#a model file is MAGIC, then the format version and the length of a json header as two little endian
+#uint32s, then the header, then the raw weights of every layer. the header has everything but the
+#weights, plus the shape and file offset of each layer. weights start on ALIGNMENT byte boundaries,
+#so they can be memory-mapped straight from the file
+MAGIC=b"NNET"
+VERSION=1
+ALIGNMENT=64
+PREFIX=struct.Struct("<4sII")
+
+def align(offset):
+    return -(-offset//ALIGNMENT)*ALIGNMENT
+
+def write_model(path,header,weights):
+    #where header is a json-able dict, and weights a list of arrays that all have the same dtype
+    header=dict(header)
+    dtype=np.dtype(weights[0].dtype)
+    header["dtype"]=dtype.str
+    header["layers"]=[]
+
+    #the offsets depend on the length of the header, which depends on the offsets, so leave room for them
+    placeholder=json.dumps(dict(header,layers=[{"shape":list(w.shape),"offset":2**62} for w in weights]))
+    offset=align(PREFIX.size+len(placeholder.encode()))
+    for w in weights:
+        header["layers"].append({"shape":list(w.shape),"offset":offset})
+        offset=align(offset+w.size*dtype.itemsize)
+    text=json.dumps(header).encode()
+
+    with open(path,"wb") as f:
+        f.write(PREFIX.pack(MAGIC,VERSION,len(text)))
+        f.write(text)
+        for layer,w in zip(header["layers"],weights):
+            f.write(b"\0"*(layer["offset"]-f.tell()))
+            f.write(np.ascontiguousarray(w,dtype=dtype).data)
+
+def read_header(f):
+    prefix=f.read(PREFIX.size)
+    if len(prefix)<PREFIX.size:
+        #empty or cut short
+        raise ValueError("Not a model file: '%s'"%f.name)
+    magic,version,length=PREFIX.unpack(prefix)
+    if magic!=MAGIC:
+        raise ValueError("Not a model file: '%s'"%f.name)
+    if version!=VERSION:
+        raise ValueError("Model file '%s' has version %s, only version %s is supported"%(f.name,version,VERSION))
+    text=f.read(length)
+    if len(text)<length:
+        raise ValueError("Model file '%s' is truncated"%f.name)
+    return json.loads(text.decode())
+
+def read_model(path,mmap=True):
+    #returns the header and the weights. with mmap, the weights are copy-on-write memory maps of the file,
+    #so loading is instant and processes loading the same file share its pages until they write to them
+    with open(path,"rb") as f:
+        header=read_header(f)
+        dtype=np.dtype(header["dtype"])
+        weights=[]
+        for layer in header["layers"]:
+            shape=tuple(layer["shape"])
+            if mmap:
+                weights.append(np.memmap(path,dtype=dtype,mode="c",offset=layer["offset"],shape=shape))
+            else:
+                f.seek(layer["offset"])
+                weights.append(np.fromfile(f,dtype=dtype,count=int(np.prod(shape))).reshape(shape))
+    return header,weights
@@ -1,24 +1,102 @@
  
 import numpy as np
-import os, random, time
+import os, time
 from utilities import *
 from constants import *
 from neural_net_view import NeuralNetView
+from optimizers import get_optimizer
+from activations import get_activation
+from profiler import PROFILER
+from model_file import write_model, read_model
+
+class Workspace:
+    #preallocated arrays for pushing up to `rows` samples at once through a net of the given sizes,
+    #so that training and batched forward passes never allocate once the workspace exists.
+    #every layer but the last has a column of ones on the right of its outputs for the bias neuron.
+    #everything is allocated with the net's dtype
+    def __init__(self,sizes,rows,dtype=float):
+        self.rows=rows
+        self.inputs=np.empty((rows,sizes[0]),dtype=dtype)
+        self.targets=np.empty((rows,sizes[-1]),dtype=dtype)
+        #for filling targets from a label vector: the index of every row's 1 in the flattened targets
+        self.label_index=np.empty(rows,dtype=np.intp)
+        self.row_offsets=np.arange(rows,dtype=np.intp)*sizes[-1]
+        #for the softmax output: the index of every row's max in the flattened outputs, one value per row,
+        #and ones to spread row values across the outputs with
+        self.max_index=np.empty(rows,dtype=np.intp)
+        self.row_scratch=np.empty((rows,1),dtype=dtype)
+        self.ones_row=np.ones((1,sizes[-1]),dtype=dtype)
+        self.ones_column=np.ones((sizes[-1],1),dtype=dtype)
+
+        #index 0 of everything but outputs is unused, like in NeuralNet
+        self.outputs=[]
+        self.activations=[-1]
+        self.corrections=[-1]
+        self.derivatives=[-1]
+        self.errors=[-1]
+        self.adjustments=[-1]
+        for i,ncount in enumerate(sizes):
+            is_last=i==len(sizes)-1
+            outputs=np.empty((rows,ncount+(0 if is_last else 1)),dtype=dtype)
+            if not is_last:
+                outputs[:,-1]=1.0
+            self.outputs.append(outputs)
+            if i==0:
+                continue
+            self.activations.append(np.empty((rows,ncount),dtype=dtype))
+            self.corrections.append(np.empty((rows,ncount),dtype=dtype))
+            #hidden layers keep their outputs here after the forward pass, without the bias column, and the
+            #backward pass turns them into derivatives in place
+            self.derivatives.append(np.empty((rows,ncount),dtype=dtype))
+            #hidden errors are propagated through the bias neuron's weights too, which is one wasted
+            #column, but multiplying by all of weights[i+1] avoids copying weights[i+1][:,:-1]
+            self.errors.append(np.empty(outputs.shape,dtype=dtype))
+            self.adjustments.append(np.empty((ncount,sizes[i-1]+1),dtype=dtype))
 
 class NeuralNet(NeuralNetView):  
     def __init__(self, sizes,learning_rate=0.1,final_learning_rate=-1,
-            verbose=0,logging=0,timer_interval=10):
+            verbose=0,logging=0,timer_interval=10,chunk_size=1024,dtype=float,
+            optimizer="sgd",weights=None,log_interval=1,log_capacity=10000,activation="tanh",output="tanh"):
+        #weights are the arrays of layers 1 and up, for nets that were trained before (see load).
+        #without them, all the weights are initialized randomly.
+        #activation is the activation of the hidden layers, or a list with one per hidden layer, and output
+        #the one of the last layer, see activations.py. a softmax output goes with the cross-entropy error,
+        #whose correction is just outputs-targets, all the others with the squared error
         if final_learning_rate==-1:
             final_learning_rate=learning_rate
         self.final_learning_rate=final_learning_rate
 
+        #every array of the net, from weights to workspaces, has this dtype. inputs are converted
+        #to it once, and nothing is ever upcast back to float64
+        self.dtype=np.dtype(dtype)
+        if self.dtype not in (np.float32,np.float64):
+            raise ValueError("NeuralNetwork only supports float32 and float64, not %s"%self.dtype)
+
+        hidden=activation if isinstance(activation,(list,tuple)) else [activation]*(len(sizes)-2)
+        if len(hidden)!=len(sizes)-2:
+            raise ValueError("NeuralNetwork got %s activations for %s hidden layers"%(len(hidden),len(sizes)-2))
+        #index 0 is unused, like weights[0]
+        self.functions=[None]+[get_activation(a) for a in hidden]+[get_activation(output)]
+        if any(f.name=="softmax" for f in self.functions[1:-1]):
+            raise ValueError("NeuralNetwork can only have a softmax output layer, not a softmax hidden layer")
+        self.output=self.functions[-1].name
+        if self.output=="softmax" and sizes[-1]<2:
+            raise ValueError("NeuralNetwork needs at least 2 outputs for softmax, sizes=%s"%(sizes,))
+
         self.sizes=sizes
         self.learning_rate = learning_rate
         self.verbose=verbose
         self.back_count=0
         self.logging=logging
+        #with logging, every log_interval-th backpropagation is recorded, and the last log_capacity records kept
+        self.log_interval=log_interval
+        self.log_capacity=log_capacity
         self.timer_interval=timer_interval
         self.batch_size=1
+        #created by get_workspace the first time it is needed
+        self.workspace=None
+        #number of rows pushed through the net at once by forward_batch and predict
+        self.chunk_size=chunk_size
         if logging:
             self.setup_logging()
         
@@ -31,23 +109,89 @@ class NeuralNet(NeuralNetView):
         self.activations=[-1 for i in sizes]
         self.corrections=[-1 for i in sizes]
 
+        if weights is not None:
+            weights=[np.zeros((sizes[0],0),dtype=self.dtype)]+list(weights)
+            shapes=[(ncount,0 if i==0 else sizes[i-1]+1) for i,ncount in enumerate(sizes)]
+            if [w.shape for w in weights]!=shapes or any(w.dtype!=self.dtype for w in weights):
+                raise ValueError("NeuralNetwork got weird weights for sizes %s and dtype %s"%(sizes,self.dtype))
+
         previous_ncount=0
         for i,ncount in enumerate(sizes):
-            #initialize all weights randomly
-            self.weights.append(0.5*np.random.random((ncount,previous_ncount))-0.25)
+            if weights is not None:
+                self.weights.append(weights[i])
+            else:
+                #initialize all weights randomly
+                self.weights.append((0.5*np.random.random((ncount,previous_ncount))-0.25).astype(self.dtype))
             #add one to ncount for bias neurons
             previous_ncount=sizes[i]+1
 
             #all activations, outputs, and corrections start at zero
             is_last=i==len(sizes)-1
-            self.outputs.append(np.zeros((ncount+(0 if is_last else 1),1),dtype=float))
+            self.outputs.append(np.zeros((ncount+(0 if is_last else 1),1),dtype=self.dtype))
+
+        #the optimizer decides how adjustments change the weights, see optimizers.py
+        self.optimizer=get_optimizer(optimizer)
+        self.optimizer.setup(self.weights)
+
+    def get_hyperparameters(self):
+        #the keyword arguments that make a net like this one, apart from its sizes and weights
+        return {"learning_rate":self.learning_rate,
+                "final_learning_rate":self.final_learning_rate,
+                "chunk_size":self.chunk_size,
+                "dtype":self.dtype.name,
+                "optimizer":self.optimizer.name,
+                "activation":[f.name for f in self.functions[1:-1]],
+                "output":self.output}
+
+    def save(self,path):
+        #writes sizes, hyperparameters and weights to one model file, see model_file.py
+        header={"sizes":list(self.sizes),
+                "hyperparameters":self.get_hyperparameters(),
+                "back_count":self.back_count,
+                "batch_size":self.batch_size}
+        write_model(path,header,self.weights[1:])
+
+    @classmethod
+    def load(cls,path,mmap=True,**kwargs):
+        #makes a net from a file written by save. with mmap the weights are mapped straight from the file,
+        #copy-on-write, so even big nets load in milliseconds. kwargs override saved hyperparameters
+        header,weights=read_model(path,mmap=mmap)
+        hyperparameters=dict(header["hyperparameters"])
+        hyperparameters.update(kwargs)
+        nn=cls(header["sizes"],weights=weights,**hyperparameters)
+        nn.back_count=header["back_count"]
+        nn.batch_size=header["batch_size"]
+        return nn
+
+    def activation_func(self,i,x):
+        #the activation of layer i for the column x of one sample. activations work on rows of samples
+        return self.functions[i].forward(x.transpose()).transpose()
 
-    def activation_func(self,x):
-        return np.tanh(x)
+    def d_activation_func(self,i,y):
+        #the derivative of layer i's activation, from the column y of its outputs for one sample
+        return self.functions[i].derivative(y.transpose()).transpose()
 
-    def d_activation_func(self,x):
-        #return self.activation_func(x)*(1-self.activation_func(x))
-        return 1-np.tanh(x)**2
+    def softmax_workspace(self,count):
+        #Softmax.forward for every row of the last layer's activations in the workspace, without allocating.
+        #reductions along rows and ufuncs broadcasting a column across rows allocate, so the max of each
+        #row is taken by index, and the max and the sum of each row are spread with an outer product.
+        #the derivatives of a softmax layer are never used, so they are free to use here
+        workspace=self.workspace
+        x=workspace.activations[-1][:count]
+        out=workspace.outputs[-1][:count]
+        scratch=workspace.row_scratch[:count]
+        spread=workspace.derivatives[-1][:count]
+
+        index=workspace.max_index[:count]
+        np.argmax(x,axis=1,out=index)
+        index+=workspace.row_offsets[:count]
+        np.take(x,index,out=scratch[:,0],mode="clip")
+        np.dot(scratch,workspace.ones_row,out=spread)
+        np.subtract(x,spread,out=out)
+        np.exp(out,out=out)
+        np.dot(out,workspace.ones_column,out=scratch)
+        np.dot(scratch,workspace.ones_row,out=spread)
+        return np.divide(out,spread,out=out)
                             
     def forward(self, inputs):
         #where inputs is simply a list of numbers, of length self.sizes[0]
@@ -63,14 +207,82 @@ class NeuralNet(NeuralNetView):
             self.activations[i] = np.dot(self.weights[i], self.outputs[i-1])
             if is_last:
                 #the last layer does not have a bias neuron to ignore, thus the if statement
-                self.outputs[i] = self.activation_func(self.activations[i])
+                self.outputs[i] = self.activation_func(i,self.activations[i])
             else:
-                self.outputs[i][:-1, :] = self.activation_func(self.activations[i])
+                self.outputs[i][:-1, :] = self.activation_func(i,self.activations[i])
 
             #set bias neuron to always output 1
             if not is_last:
                 self.outputs[i][-1:, :] = 1.0
 
+    def forward_batch(self,X,chunk_size=None):
+        #where X is a matrix of shape (N, self.sizes[0]), one row per sample
+        #returns the (N, self.sizes[-1]) outputs of the final layer, computed one chunk of rows at a time.
+        #arrays of any dtype are only cast a chunk at a time, so X can be a memory map, and an X that
+        #makes its rows with get_rows, like data_manager.AugmentedImages, makes them a chunk at a time
+        made=hasattr(X,"get_rows")
+        if not isinstance(X,np.ndarray) and not made:
+            X=np.asarray(X,dtype=self.dtype)
+        if len(X.shape)==1:
+            X=X.reshape(1,-1)
+        if X.shape[1]!=self.sizes[0]:
+            raise ValueError("NeuralNetwork.forward_batch got weird X data. X.shape=%s sizes[0]=%s"%(
+                X.shape,self.sizes[0]))
+        if chunk_size is None:
+            chunk_size=self.chunk_size
+
+        result=np.empty((X.shape[0],self.sizes[-1]),dtype=self.dtype)
+        for start in range(0,X.shape[0],chunk_size):
+            if made:
+                rows=X.get_rows(np.arange(start,min(start+chunk_size,X.shape[0])))
+            else:
+                rows=X[start:start+chunk_size]
+            result[start:start+chunk_size]=self.forward_rows(rows)
+        return result
+
+    def get_workspace(self,rows):
+        #the workspace is only replaced when a batch does not fit in it, so it is sized once per run
+        if self.workspace is None or self.workspace.rows<rows:
+            self.workspace=Workspace(self.sizes,rows,self.dtype)
+        return self.workspace
+
+    def forward_rows(self,rows):
+        #same as forward, but for a whole matrix of inputs at once: one matrix multiply per layer.
+        #returns a view of the workspace, which the next batch overwrites
+        count=rows.shape[0]
+        workspace=self.get_workspace(count)
+        np.copyto(workspace.inputs[:count],rows)
+        return self.forward_workspace(count)
+
+    def forward_workspace(self,count):
+        #pushes the first count rows of workspace.inputs through the net, writing every layer in place
+        workspace=self.workspace
+        self.workspace_count=count
+        np.copyto(workspace.outputs[0][:count,:-1],workspace.inputs[:count])
+
+        for i in range(1,len(self.sizes)):
+            is_last=i==len(self.sizes)-1
+
+            activations=workspace.activations[i][:count]
+            np.dot(workspace.outputs[i-1][:count],self.weights[i].transpose(),out=activations)
+            if is_last and self.output=="softmax":
+                self.softmax_workspace(count)
+            elif is_last:
+                self.functions[i].forward(activations,out=workspace.outputs[i][:count])
+            else:
+                #ufuncs allocate an iterator when writing around the bias column, copyto does not.
+                #the outputs stay in derivatives for the backward pass, see Workspace.
+                #the bias column of outputs was set to 1 when the workspace was made, and is never written
+                values=workspace.derivatives[i][:count]
+                self.functions[i].forward(activations,out=values)
+                np.copyto(workspace.outputs[i][:count,:-1],values)
+        return workspace.outputs[-1][:count]
+
+    def predict(self,X,chunk_size=None):
+        #returns one prediction per row of X, see get_predictions
+        with PROFILER.span("evaluate"):
+            return self.get_predictions(self.forward_batch(X,chunk_size))
+
     def get_adjustments(self,desired_outputs):
         adjustments=[]
         for i in reversed(range(1,len(self.sizes))):
@@ -79,7 +291,7 @@ class NeuralNet(NeuralNetView):
             if is_last:
                 #the last calculation uses an error based on desired_outputs, instead of
                 #the next layer, since there is no next layer
-                desired_array=np.array(desired_outputs,dtype=float)
+                desired_array=np.array(desired_outputs,dtype=self.dtype)
                 desired_array=desired_array.reshape(desired_array.shape[0],1)
                 error=self.outputs[-1] - desired_array
             else:
@@ -87,19 +299,64 @@ class NeuralNet(NeuralNetView):
                 error=np.dot(self.weights[i+1][:,:-1].transpose(), self.corrections[i+1])
             
             #use error to calculate gradient descent corrections
-            self.corrections[i] = self.d_activation_func(self.activations[i]) * error
+            if is_last and self.output=="softmax":
+                self.corrections[i] = error
+            else:
+                self.corrections[i] = self.d_activation_func(i,self.outputs[i][:self.sizes[i]]) * error
 
             adj=np.dot(self.corrections[i],self.outputs[i-1].transpose()) 
             adjustments.append(adj)
         adjustments.reverse()
         return adjustments
 
+    def get_batch_adjustments(self,desired_outputs):
+        #same as get_adjustments, but for the whole batch last pushed through forward_rows.
+        #each layer's adjustment is the sum of the per-sample adjustments, computed as one matrix multiply.
+        #the returned arrays belong to the workspace, and are overwritten by the next backward pass
+        count=self.workspace_count
+        np.copyto(self.workspace.targets[:count],desired_outputs)
+        self.backpropagate(count)
+        return self.workspace.adjustments[1:]
+
+    def backpropagate(self,count,learning_rate=None):
+        #computes every layer's adjustment in the workspace from workspace.targets. if learning_rate is
+        #given, each layer is also adjusted right away, before the error is propagated through its weights,
+        #like backward does
+        workspace=self.workspace
+        for i in reversed(range(1,len(self.sizes))):
+            is_last=i==len(self.sizes)-1
+
+            error=workspace.errors[i][:count]
+            if is_last:
+                np.subtract(workspace.outputs[-1][:count],workspace.targets[:count],out=error)
+            else:
+                #rows of corrections are samples, so the propagated error is corrections times weights
+                np.dot(workspace.corrections[i+1][:count],self.weights[i+1],out=error)
+                error=error[:,:-1]
+
+            #the error is copied first so that the multiplication only sees contiguous arrays.
+            #the cross-entropy error of a softmax is already the correction
+            corrections=workspace.corrections[i][:count]
+            np.copyto(corrections,error)
+            if not (is_last and self.output=="softmax"):
+                derivatives=workspace.derivatives[i][:count]
+                #hidden outputs are in derivatives already, see forward_workspace
+                outputs=workspace.outputs[i][:count] if is_last else derivatives
+                corrections*=self.functions[i].derivative(outputs,out=derivatives)
+
+            adj=workspace.adjustments[i]
+            np.dot(corrections.transpose(),workspace.outputs[i-1][:count],out=adj)
+            if learning_rate is not None:
+                with PROFILER.span("adjust"):
+                    self.optimizer.step(i,self.weights[i],adj,learning_rate)
+
     def adjust_weights(self, adjustments, learning_rate):
         if self.verbose>1:
             print_color("Adjusting weights.",COLORS.ORANGE)
         self.back_count+=1
-        for i in range(1,len(self.sizes)):
-            self.weights[i] = self.weights[i] - learning_rate * adjustments[i-1]
+        with PROFILER.span("adjust"):
+            for i in range(1,len(self.sizes)):
+                self.optimizer.step(i,self.weights[i],adjustments[i-1],learning_rate)
         
         if self.logging:
             self.log()
@@ -119,7 +376,7 @@ class NeuralNet(NeuralNetView):
         if self.verbose>1:
             print_color("Starting backward.",COLORS.ORANGE)
 
-        desired_array=np.array(desired_outputs,dtype=float)
+        desired_array=np.array(desired_outputs,dtype=self.dtype)
         desired_array=desired_array.reshape(desired_array.shape[0],1)
         error = self.outputs[-1] - desired_array
         assert error.shape == self.outputs[-1].shape
@@ -129,66 +386,194 @@ class NeuralNet(NeuralNetView):
             if is_last:
                 #the last calculation uses an error based on desired_outputs, instead of
                 #the next layer, since there is no next layer
-                self.corrections[i] = self.d_activation_func(self.activations[i]) * error
+                if self.output=="softmax":
+                    self.corrections[i] = error
+                else:
+                    self.corrections[i] = self.d_activation_func(i,self.outputs[i]) * error
             else:
                 #if not last layer, get propagate error from next layer
-                self.corrections[i] = self.d_activation_func(self.activations[i]) * np.dot(self.weights[i+1][:,:-1].transpose(), self.corrections[i+1])
+                self.corrections[i] = self.d_activation_func(i,self.outputs[i][:-1]) * np.dot(self.weights[i+1][:,:-1].transpose(), self.corrections[i+1])
 
             #adjust weights according to those corrections
-            self.weights[i] = self.weights[i] - custom_learning_rate * np.dot(self.corrections[i],
-                    self.outputs[i-1].transpose()) 
+            self.optimizer.step(i,self.weights[i],np.dot(self.corrections[i],self.outputs[i-1].transpose()),
+                    custom_learning_rate)
         
         if self.logging:
             self.log()
 
-    def train(self,X,Y,trial_count,batch_size=1):
+    def backward_rows(self,desired_outputs,learning_rate):
+        #same as backward, but for the whole batch last pushed through forward_rows, see backward_workspace
+        count=self.workspace_count
+        np.copyto(self.workspace.targets[:count],desired_outputs)
+        self.backward_workspace(count,learning_rate)
+
+    def backward_workspace(self,count,learning_rate):
+        #a single sample adjusts each layer before propagating the error through it, like backward.
+        #a batch takes the gradient of every layer first, and then one optimizer step per layer, so no
+        #layer sees weights that were already adjusted for this batch
+        self.back_count+=1
+        if self.verbose>1:
+            print_color("Starting backward.",COLORS.ORANGE)
+
+        if count==1:
+            self.backpropagate(count,learning_rate)
+        else:
+            self.backpropagate(count)
+            for i in range(1,len(self.sizes)):
+                with PROFILER.span("adjust"):
+                    self.optimizer.step(i,self.weights[i],self.workspace.adjustments[i],learning_rate)
+
+        if self.logging:
+            self.log(self.workspace)
+
+    def train(self,X,Y,trial_count,batch_size=1,valid_X=None,valid_Y=None,eval_interval=1000,patience=5,
+            min_improvement=0.0,first_trial=0,stop_trial=None):
+        #if valid_X and valid_Y are given, the validation accuracy is checked every eval_interval trials.
+        #training stops early once it failed to beat the best accuracy so far by more than min_improvement
+        #patience times in a row, and the weights with the best accuracy are kept.
+        #first_trial and stop_trial train only those trials of the trial_count, so training can be continued
+        #later from the current weights with the same learning rate schedule, see scheduler.py
         self.batch_size=batch_size
+        if stop_trial is None:
+            stop_trial=trial_count
+        if not 0<=first_trial<=stop_trial<=trial_count:
+            raise ValueError("NeuralNetwork.train got weird trials, first_trial=%s stop_trial=%s trial_count=%s"%(
+                first_trial,stop_trial,trial_count))
 
-        if len(X) != len(Y) or len(X[0]) != self.sizes[0]:
-            raise ValueError("NeuralNetwork.train got weird X or Y data. len(X)=%s len(Y)=%s len(X[0])=%s sizes[0]=%s"%(
-                len(X),len(Y),len(X[0]),self.sizes[0]))
+        #X is converted to an array of the net's dtype once, so batches are just fancy indexing from here
+        #on. X is left alone if it already is an array, so a memory map like Dataset.rows() is only ever
+        #read a batch at a time by gather, or if it makes the rows of a batch with get_rows, like a Dataset,
+        #which normalizes them, or data_manager.AugmentedImages, whose samples never all exist at once.
+        if not isinstance(X,np.ndarray) and not hasattr(X,"get_rows"):
+            X=np.ascontiguousarray(X,dtype=self.dtype)
+        if len(X) != len(Y) or X.shape[1:] != (self.sizes[0],):
+            raise ValueError("NeuralNetwork.train got weird X or Y data. len(X)=%s len(Y)=%s X.shape=%s sizes[0]=%s"%(
+                len(X),len(Y),X.shape,self.sizes[0]))
         if self.verbose:
-            print_color("Started training for %s trials."%trial_count,COLORS.YELLOW)
+            print_color("Started training for %s trials."%(stop_trial-first_trial),COLORS.YELLOW)
 
-        #convert Y=[[2],[0],[1]...] to Y=[[0,0,1],[1,0,0],[0,1,0]...], or does nothing if Y=[[1],[0] ...]
-        Y=neuronize(Y)
+        Y=self.get_targets(Y)
 
         timer=Timer(self.timer_interval)
         start_time=time.time()
 
-        #initialize minibatch variables
-        self.batch_counter=0
-        self.adjustments=[]
+        validating=valid_X is not None
+        if validating:
+            if not isinstance(valid_X,np.ndarray) and not hasattr(valid_X,"get_rows"):
+                valid_X=np.ascontiguousarray(valid_X,dtype=self.dtype)
+            self.start_validation()
+            next_validation=first_trial+eval_interval
+            misses=0
+        self.stopped_trial=stop_trial
 
-        for i in range(trial_count):
-            self.batch_counter+=1
-            if self.verbose:
-                elapsed=time.time()-start_time
-                estimate=round((trial_count-i)/((i+1)/elapsed)/60,2)
-                timer.tick("Running trial %s/%s. Minutes remaining: %s"%(i,trial_count,estimate))
-            index=random.randint(0,len(X)-1)
-            self.forward(X[index])
+        with PROFILER.span("train"):
+            self.get_workspace(batch_size)
+            self.sampler=EpochSampler(len(X),batch_size)
+            try:
+                for trial,indices in self.sampler.batches(stop_trial-first_trial):
+                    #the learning rate is the one of the batch's last trial
+                    i=first_trial+trial+len(indices)-1
+                    if self.verbose:
+                        self.tick(timer,i,trial_count,start_time)
+                    self.mini_batch(X,Y,indices,self.get_learning_rate(i,trial_count))
 
-            adjusted_learning_rate=self.learning_rate-(self.learning_rate-self.final_learning_rate)*(i/trial_count)
+                    if validating and i+1>=next_validation:
+                        next_validation+=eval_interval
+                        misses=0 if self.validate(valid_X,valid_Y,i+1,min_improvement) else misses+1
+                        if misses>=patience:
+                            self.stopped_trial=i+1
+                            if self.verbose:
+                                print_color("Stopping early after %s trials, best validation accuracy %s after %s."%(
+                                    i+1,self.best_accuracy,self.best_trial),COLORS.YELLOW)
+                            break
+            finally:
+                if self.logging:
+                    #stops the log's flusher thread and releases its buffers, until the next train
+                    self.training_log.close()
 
-            if batch_size>1:
-                should_adjust=self.batch_counter>=batch_size or i==trial_count-1
-                self.mini_batch(adjusted_learning_rate,Y,index,should_adjust)
-            else:
-                self.backward(Y[index],custom_learning_rate=adjusted_learning_rate)
+            if validating:
+                if not self.history or self.history[-1][0]!=self.stopped_trial:
+                    self.validate(valid_X,valid_Y,self.stopped_trial,min_improvement)
+                for weights,best in zip(self.weights,self.best_weights):
+                    np.copyto(weights,best)
 
         if self.verbose:
             timer.stop("Training")
 
-    def mini_batch(self,adjusted_learning_rate,Y,index,should_adjust):
-        if not self.adjustments:
-            self.adjustments=self.get_adjustments(Y[index])
+    def get_targets(self,Y):
+        #the Y that gather takes. with several outputs, Y=[[2],[0],[1]...], Y=[2,0,1...] and one-hot Y all
+        #become a label vector, and gather makes the one-hot targets of a batch from it, so they never
+        #exist for all of Y. with one output, Y becomes a column of the net's dtype
+        if self.sizes[-1]>1:
+            Y=get_labels(Y)
+            if len(Y) and (Y.min()<0 or Y.max()>=self.sizes[-1]):
+                raise ValueError("NeuralNetwork.train got labels from %s to %s for %s outputs"%(
+                    Y.min(),Y.max(),self.sizes[-1]))
+            return Y
+        return np.ascontiguousarray(Y,dtype=self.dtype).reshape(len(Y),1)
+
+    def start_validation(self):
+        #the best weights are copied into arrays made once here, and copied back at the end of training
+        self.history=[]
+        self.best_weights=[np.copy(w) for w in self.weights]
+        self.best_accuracy=-1
+        self.best_trial=0
+
+    def validate(self,valid_X,valid_Y,trial,min_improvement):
+        #scores the current weights, remembers them if they are the best so far.
+        #returns whether they beat the best accuracy by more than min_improvement
+        accuracy=self.get_accuracy(valid_X,valid_Y)
+        self.history.append((trial,accuracy))
+        if self.verbose:
+            print_color("Validation accuracy after %s trials: %s"%(trial,accuracy),COLORS.YELLOW)
+        if accuracy<=self.best_accuracy+min_improvement:
+            return False
+        self.best_accuracy=accuracy
+        self.best_trial=trial
+        for best,weights in zip(self.best_weights,self.weights):
+            np.copyto(best,weights)
+        return True
+
+    def get_learning_rate(self,trial,trial_count):
+        #linearly approaches final_learning_rate throughout the trials
+        return self.learning_rate-(self.learning_rate-self.final_learning_rate)*(trial/trial_count)
+
+    def tick(self,timer,trial,trial_count,start_time):
+        elapsed=time.time()-start_time
+        estimate=round((trial_count-trial)/((trial+1)/elapsed)/60,2)
+        timer.tick("Running trial %s/%s (epoch %s). Minutes remaining: %s"%(
+            trial,trial_count,self.sampler.epoch,estimate))
+
+    def mini_batch(self,X,Y,indices,adjusted_learning_rate):
+        #one forward and one backward pass for the rows of X and Y at indices, without allocating anything
+        with PROFILER.span("mini_batch"):
+            with PROFILER.span("gather"):
+                count=self.gather(X,Y,indices)
+            with PROFILER.span("forward"):
+                self.forward_workspace(count)
+            with PROFILER.span("backward"):
+                self.backward_workspace(count,adjusted_learning_rate)
+
+    def gather(self,X,Y,indices):
+        #copies the rows of X and Y at indices into the workspace, returns how many there are.
+        #Y is either targets, one row per sample, or a label vector (see train).
+        #take's default mode buffers its output, clip writes straight into the workspace
+        workspace=self.workspace
+        count=len(indices)
+        if hasattr(X,"get_rows"):
+            np.copyto(workspace.inputs[:count],X.get_rows(indices),casting="unsafe")
+        elif X.dtype==self.dtype:
+            np.take(X,indices,axis=0,out=workspace.inputs[:count],mode="clip")
+        else:
+            #take can't cast, so an X of another dtype, like a float32 memory map, takes a copy of the batch
+            np.copyto(workspace.inputs[:count],X[indices],casting="unsafe")
+        if Y.ndim==1:
+            targets=workspace.targets[:count]
+            targets.fill(0)
+            index=workspace.label_index[:count]
+            np.take(Y,indices,out=index,mode="clip")
+            index+=workspace.row_offsets[:count]
+            np.put(targets,index,1)
         else:
-            new_adj=self.get_adjustments(Y[index])
-            for j,adj in enumerate(self.adjustments):
-                adj+=new_adj[j]
-                
-        if should_adjust:
-            self.batch_counter=0
-            self.adjust_weights(self.adjustments,learning_rate=adjusted_learning_rate)
-            self.adjustments=[]
+            np.take(Y,indices,axis=0,out=workspace.targets[:count],mode="clip")
+        return count
@@ -1,21 +1,16 @@
 
-import os
+import os, csv, itertools
+import numpy as np
 from utilities import *
 from constants import *
+from training_log import TrainingLog
+from profiler import PROFILER
 
 class NeuralNetView:  
     def setup_logging(self):
-        names=("weights","outputs","activations","corrections")
+        #the log goes to binary ring buffers in LOGFOLDER, see training_log.py and read_log
         if self.logging:
-            try:
-                os.mkdir(LOGFOLDER)
-            except OSError:
-                pass
-            try:
-                for name in names:
-                    os.remove(self.get_log_path(name))
-            except FileNotFoundError:
-                pass 
+            self.training_log=TrainingLog(LOGFOLDER,capacity=self.log_capacity,interval=self.log_interval)
             
     def show(self,weights=False,outputs=False,activations=False,corrections=False,all=False):
         #this is a convenient way to show some or all of the NN info
@@ -34,27 +29,23 @@ class NeuralNetView:
         if corrections or all:
             show_np_list("corrections",self.corrections)
 
-    def log(self):
-        #appends the current state of the NN to log files
-        items={"weights":self.weights,
-                "outputs":self.outputs,
-                "activations":self.activations,
-                "corrections":self.corrections}
-        for key in items:
-            text=[]
-            item=items[key]
-            for w in item:
-                if type(w) is int:
-                    text+=[w]
-                else:
-                    text+=w.flatten().tolist()
-            digits=20 if key in ("corrections","weights") else 3
-            text=",".join([str(round(i,digits)) for i in text])
-            with open(self.get_log_path(key),"a") as f:
-                f.write("\n"+text)
-
-    def get_log_path(self,label):
-        return LOGFOLDER+label+"-log.csv"
+    def log(self,workspace=None):
+        #records the current state of the NN in the training log. after a batched step, the state of
+        #the batch's first sample is recorded, which is what forward and backward would have left.
+        #steps that aren't recorded return before gathering anything
+        if not self.training_log.is_recorded(self.back_count):
+            return
+        if workspace is None:
+            outputs,activations,corrections=self.outputs,self.activations[1:],self.corrections[1:]
+        else:
+            outputs=[a[0] for a in workspace.outputs]
+            activations=[a[0] for a in workspace.activations[1:]]
+            corrections=[a[0] for a in workspace.corrections[1:]]
+        with PROFILER.span("log"):
+            self.training_log.record(self.back_count,{"weights":self.weights[1:],
+                    "outputs":outputs,
+                    "activations":activations,
+                    "corrections":corrections})
 
     def get_prediction(self,output):
         #if output is just one neuron, then return 0 or 1 based on its weight
@@ -65,26 +56,26 @@ class NeuralNetView:
             result=output.tolist().index(max(output))
         return result
 
+    def get_predictions(self,outputs):
+        #same as get_prediction, but for a whole (N, self.sizes[-1]) matrix of outputs at once
+        if outputs.shape[1]==1:
+            return (outputs[:,0]>0.5).astype(int)
+        return outputs.argmax(axis=1)
+
+    def get_accuracy(self,X,Y):
+        #the fraction of X that is predicted right, without building a whole error report
+        return float(np.mean(self.predict(X)==get_labels(Y)))
+
     def get_error_report(self,label,X,Y):
         #gets predictions for all of X, compares to Y
-        errors=[]
-        predictions={}
-        success_count=0
-        for i in range(len(X)):
-            self.forward(X[i])
-            output=self.get_output()
-            prediction=self.get_prediction(output)
-            if prediction in predictions:
-                predictions[prediction]+=1
-            else:
-                predictions[prediction]=1
-            expected=Y[i][0]
-
-            if prediction == expected:
-                success_count+=1
-            else:
-                errors.append("prediction=%s expected=%s case=%s"%(prediction,expected,str(X[i])))
+        predicted=self.predict(X)
+        expected=get_labels(Y)
+        wrong=np.flatnonzero(predicted!=expected)
 
+        errors=["prediction=%s expected=%s case=%s"%(predicted[i],expected[i],str(X[i])) for i in wrong]
+        classes,counts=np.unique(predicted,return_counts=True)
+        predictions={int(c):int(n) for c,n in zip(classes,counts)}
+        success_count=len(X)-len(wrong)
         accuracy=success_count/len(X)
         
         return {label+" errors":errors,
@@ -93,6 +84,31 @@ class NeuralNetView:
                 label+" fail count":len(X)-success_count,
                 label+" accuracy":accuracy}
 
+    def make_predictions_csv(self,target_csv,predictions_csv,has_header=True,chunk_size=None,mean=0.0,std=1.0):
+        #streams target_csv through the net, chunk_size rows at a time, and writes one Id,Prediction row
+        #per row to predictions_csv, where Id is the first column of target_csv. like when training,
+        #inputs get mean subtracted and are divided by std. memory use does not grow with the file.
+        #returns the number of predictions
+        if chunk_size is None:
+            chunk_size=self.chunk_size
+        count=0
+        with open(target_csv,"r") as source, open(predictions_csv,"w",newline="") as destination:
+            reader=csv.reader(source,delimiter=",")
+            writer=csv.writer(destination)
+            if has_header:
+                next(reader)
+            writer.writerow(["Id","Prediction"])
+            while True:
+                rows=list(itertools.islice(reader,chunk_size))
+                if not rows:
+                    break
+                X=np.array([row[1:] for row in rows],dtype=self.dtype)
+                X-=mean
+                X/=std
+                writer.writerows(zip([row[0] for row in rows],self.predict(X).tolist()))
+                count+=len(rows)
+        return count
+
     def get_report(self,train_X,train_Y,valid_X,valid_Y):
         #gets predictions for all of X, compares to Y, returns a report
 
@@ -0,0 +1,100 @@
+import numpy as np
+
+#every optimizer adjusts one layer at a time, in place, with step(i,weights,adjustment,learning_rate),
+#where adjustment is the summed gradient for weights. adjustment is used as scratch space, so it is
+#overwritten. all the state an optimizer needs is allocated once by setup, from the net's weights
+
+class SGD:
+    #plain gradient descent, weights-=learning_rate*adjustment
+    name="sgd"
+
+    def setup(self,weights):
+        pass
+
+    def step(self,i,weights,adjustment,learning_rate):
+        adjustment*=learning_rate
+        weights-=adjustment
+
+class Momentum:
+    #keeps a velocity per layer: velocity=momentum*velocity-learning_rate*adjustment, weights+=velocity
+    name="momentum"
+
+    def __init__(self,momentum=0.9):
+        self.momentum=momentum
+
+    def setup(self,weights):
+        self.velocities=[np.zeros(w.shape,dtype=w.dtype) for w in weights]
+
+    def step(self,i,weights,adjustment,learning_rate):
+        velocity=self.velocities[i]
+        velocity*=self.momentum
+        adjustment*=learning_rate
+        velocity-=adjustment
+        weights+=velocity
+
+class Nesterov(Momentum):
+    #like Momentum, but weights move by where the velocity is heading:
+    #weights+=momentum*velocity-learning_rate*adjustment, the same update as lasagne's nesterov_momentum
+    name="nesterov"
+
+    def setup(self,weights):
+        Momentum.setup(self,weights)
+        self.scratch=[np.zeros(w.shape,dtype=w.dtype) for w in weights]
+
+    def step(self,i,weights,adjustment,learning_rate):
+        velocity=self.velocities[i]
+        velocity*=self.momentum
+        adjustment*=learning_rate
+        velocity-=adjustment
+        weights-=adjustment
+        weights+=np.multiply(velocity,self.momentum,out=self.scratch[i])
+
+class Adam:
+    #keeps running averages of the adjustments and of their squares per layer, and moves every weight
+    #by about learning_rate, whatever the scale of its adjustments
+    name="adam"
+
+    def __init__(self,beta1=0.9,beta2=0.999,epsilon=1e-8):
+        self.beta1=beta1
+        self.beta2=beta2
+        self.epsilon=epsilon
+
+    def setup(self,weights):
+        self.means=[np.zeros(w.shape,dtype=w.dtype) for w in weights]
+        self.variances=[np.zeros(w.shape,dtype=w.dtype) for w in weights]
+        self.scratch=[np.zeros(w.shape,dtype=w.dtype) for w in weights]
+        #layers are adjusted one at a time, so each counts its own steps for the bias correction
+        self.steps=[0 for w in weights]
+
+    def step(self,i,weights,adjustment,learning_rate):
+        mean=self.means[i]
+        variance=self.variances[i]
+        scratch=self.scratch[i]
+        self.steps[i]+=1
+        t=self.steps[i]
+
+        np.square(adjustment,out=scratch)
+        scratch*=1-self.beta2
+        variance*=self.beta2
+        variance+=scratch
+
+        adjustment*=1-self.beta1
+        mean*=self.beta1
+        mean+=adjustment
+
+        corrected_rate=learning_rate*np.sqrt(1-self.beta2**t)/(1-self.beta1**t)
+        np.sqrt(variance,out=scratch)
+        scratch+=self.epsilon
+        np.divide(mean,scratch,out=scratch)
+        scratch*=corrected_rate
+        weights-=scratch
+
+OPTIMIZERS={optimizer.name:optimizer for optimizer in (SGD,Momentum,Nesterov,Adam)}
+
+def get_optimizer(optimizer):
+    #takes the name of an optimizer, or an optimizer object, which is returned as is
+    if not isinstance(optimizer,str):
+        return optimizer
+    if optimizer not in OPTIMIZERS:
+        raise ValueError("Unknown optimizer '%s', pick one of %s"%(optimizer,", ".join(sorted(OPTIMIZERS))))
+    return OPTIMIZERS[optimizer]()
@@ -0,0 +1,289 @@
+import multiprocessing, time
+from multiprocessing import shared_memory
+import numpy as np
+from utilities import *
+from constants import *
+from neural_net import NeuralNet
+
+#arrays in a SharedArrays block start on cache line boundaries
+ALIGNMENT=64
+
+class SharedArrays:
+    #a list of numpy arrays living in one block of shared memory. other processes attach to the block
+    #by name with SharedArrays.attach(spec), and then read and write the very same memory
+    def __init__(self,shapes,dtype,name=None):
+        self.shapes=[tuple(shape) for shape in shapes]
+        self.dtype=np.dtype(dtype)
+
+        offsets=[]
+        size=0
+        for shape in self.shapes:
+            offsets.append(size)
+            nbytes=int(np.prod(shape))*self.dtype.itemsize
+            size+=-(-nbytes//ALIGNMENT)*ALIGNMENT
+
+        self.owner=name is None
+        if self.owner:
+            self.memory=shared_memory.SharedMemory(create=True,size=max(size,1))
+        else:
+            #attaching registers the name with the resource tracker the parent already uses, which
+            #is a no-op. only the process that made the block unlinks it
+            self.memory=shared_memory.SharedMemory(name=name)
+
+        self.arrays=[np.ndarray(shape,dtype=self.dtype,buffer=self.memory.buf,offset=offset)
+                for shape,offset in zip(self.shapes,offsets)]
+
+    @classmethod
+    def copy_of(cls,arrays,dtype):
+        shared=cls([a.shape for a in arrays],dtype)
+        for target,source in zip(shared.arrays,arrays):
+            np.copyto(target,source,casting="same_kind")
+        return shared
+
+    @classmethod
+    def attach(cls,spec):
+        name,shapes,dtype=spec
+        return cls(shapes,dtype,name=name)
+
+    def spec(self):
+        #everything another process needs to attach to this block, small enough to pickle
+        return (self.memory.name,self.shapes,self.dtype.str)
+
+    def close(self):
+        #arrays must not be used after this
+        self.arrays=[]
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+def split_trials(trial_count,workers):
+    #splits trial_count into one count per worker, the first workers get the leftovers
+    return [trial_count//workers+(1 if k<trial_count%workers else 0) for k in range(workers)]
+
+def share_data(nn,X,Y):
+    #X in shared memory as the net's dtype, and Y as NeuralNet.get_targets makes it, so with several
+    #outputs the processes share a label vector instead of a one-hot matrix
+    data=SharedArrays.copy_of((X,),nn.dtype)
+    try:
+        targets=SharedArrays.copy_of((Y,),Y.dtype)
+    except BaseException:
+        data.close()
+        raise
+    return data,targets
+
+def hogwild_worker(weights_spec,data_spec,targets_spec,sizes,hyperparameters,trial_count,batch_size,seed,
+        back_counts,k):
+    #runs the regular training loop of a NeuralNet whose weights are the shared ones. backpropagate
+    #adjusts weights in place, so every step lands in shared memory, without any locks
+    np.random.seed(seed)
+    weights=SharedArrays.attach(weights_spec)
+    data=SharedArrays.attach(data_spec)
+    targets=SharedArrays.attach(targets_spec)
+    try:
+        nn=NeuralNet(sizes,**hyperparameters)
+        nn.weights[1:]=weights.arrays
+        nn.train(data.arrays[0],targets.arrays[0],trial_count,batch_size=batch_size)
+        back_counts[k]=nn.back_count
+        #shared memory can only be closed once nothing points into it anymore
+        nn.weights=[]
+    finally:
+        weights.close()
+        data.close()
+        targets.close()
+
+def train_hogwild(nn,X,Y,trial_count,workers,batch_size=1):
+    #trains nn with workers processes at once, Hogwild style: every process runs plain SGD on its share
+    #of the trials, reading and writing the same weights in shared memory without any locking.
+    #returns the number of training samples per second over all processes
+    if workers<1:
+        raise ValueError("train_hogwild needs at least one worker, got %s"%workers)
+    if nn.verbose:
+        print_color("Started Hogwild training for %s trials on %s workers."%(trial_count,workers),COLORS.YELLOW)
+
+    X=np.ascontiguousarray(X,dtype=nn.dtype)
+    Y=nn.get_targets(Y)
+    if len(X)!=len(Y) or X.shape[1]!=nn.sizes[0]:
+        raise ValueError("train_hogwild got weird X or Y data. X.shape=%s Y.shape=%s sizes[0]=%s"%(
+            X.shape,Y.shape,nn.sizes[0]))
+
+    weights=SharedArrays.copy_of(nn.weights[1:],nn.dtype)
+    data,targets=share_data(nn,X,Y)
+    try:
+        seeds=np.random.randint(0,2**31-1,workers)
+        back_counts=multiprocessing.Array("q",workers)
+        processes=[multiprocessing.Process(target=hogwild_worker,args=(weights.spec(),data.spec(),
+                targets.spec(),nn.sizes,nn.get_hyperparameters(),count,batch_size,int(seeds[k]),back_counts,k))
+                for k,count in enumerate(split_trials(trial_count,workers))]
+
+        start_time=time.time()
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        duration=time.time()-start_time
+
+        failed=[process.exitcode for process in processes if process.exitcode!=0]
+        if failed:
+            raise RuntimeError("%s Hogwild workers failed, exit codes: %s"%(len(failed),failed))
+
+        for target,source in zip(nn.weights[1:],weights.arrays):
+            np.copyto(target,source)
+    finally:
+        weights.close()
+        data.close()
+        targets.close()
+
+    nn.back_count+=sum(back_counts)
+    nn.batch_size=batch_size
+    if nn.verbose:
+        print_color("Hogwild training took %s seconds."%round(duration,1),COLORS.YELLOW)
+    return trial_count/duration
+
+def data_parallel_worker(connection,weights_spec,data_spec,targets_spec,indices_spec,adjustments_spec,
+        sizes,hyperparameters,shard_size,k):
+    #waits for (start, stop) messages, computes the adjustments for the rows of the current batch between
+    #start and stop, and writes them to its own slot of the shared adjustments. None means stop
+    weights=SharedArrays.attach(weights_spec)
+    data=SharedArrays.attach(data_spec)
+    targets=SharedArrays.attach(targets_spec)
+    indices=SharedArrays.attach(indices_spec)
+    adjustments=SharedArrays.attach(adjustments_spec)
+    layers=len(sizes)-1
+    try:
+        nn=NeuralNet(sizes,**hyperparameters)
+        nn.weights[1:]=weights.arrays
+        nn.get_workspace(shard_size)
+        X=data.arrays[0]
+        Y=targets.arrays[0]
+        batch=indices.arrays[0]
+        mine=adjustments.arrays[k*layers:(k+1)*layers]
+
+        message=connection.recv()
+        while message is not None:
+            start,stop=message
+            if stop>start:
+                count=nn.gather(X,Y,batch[start:stop])
+                nn.forward_workspace(count)
+                nn.backpropagate(count)
+                for target,adj in zip(mine,nn.workspace.adjustments[1:]):
+                    np.copyto(target,adj)
+            else:
+                for target in mine:
+                    target.fill(0)
+            connection.send(k)
+            message=connection.recv()
+
+        #shared memory can only be closed once nothing points into it anymore
+        nn.weights=[]
+        X=Y=batch=mine=None
+    finally:
+        weights.close()
+        data.close()
+        targets.close()
+        indices.close()
+        adjustments.close()
+
+def train_data_parallel(nn,X,Y,trial_count,workers,batch_size):
+    #trains nn on mini-batches that are split across workers processes. every worker computes the
+    #adjustments for its shard of the batch, and nn adds them up in worker order and adjusts its weights
+    #once per batch. the shard sums add up to the batch's sum, so this is plain mini-batch gradient descent
+    #(without backward's layer by layer adjusting), and the result only depends on the seed and the
+    #number of workers. returns the number of training samples per second
+    if workers<1:
+        raise ValueError("train_data_parallel needs at least one worker, got %s"%workers)
+    if nn.verbose:
+        print_color("Started data parallel training for %s trials on %s workers."%(trial_count,workers),
+                COLORS.YELLOW)
+
+    X=np.ascontiguousarray(X,dtype=nn.dtype)
+    Y=nn.get_targets(Y)
+    if len(X)!=len(Y) or X.shape[1]!=nn.sizes[0]:
+        raise ValueError("train_data_parallel got weird X or Y data. X.shape=%s Y.shape=%s sizes[0]=%s"%(
+            X.shape,Y.shape,nn.sizes[0]))
+
+    own_weights=nn.weights
+    shard_size=-(-batch_size//workers)
+    weights=SharedArrays.copy_of(nn.weights[1:],nn.dtype)
+    data,targets=share_data(nn,X,Y)
+    indices=SharedArrays([(batch_size,)],np.intp)
+    adjustments=SharedArrays([w.shape for w in nn.weights[1:]]*workers,nn.dtype)
+    connections=[]
+    processes=[]
+    try:
+        for k in range(workers):
+            parent_end,worker_end=multiprocessing.Pipe()
+            connections.append(parent_end)
+            processes.append(multiprocessing.Process(target=data_parallel_worker,args=(worker_end,
+                weights.spec(),data.spec(),targets.spec(),indices.spec(),adjustments.spec(),
+                nn.sizes,nn.get_hyperparameters(),shard_size,k)))
+        for process in processes:
+            process.start()
+
+        #adjusting nn's weights now adjusts the shared ones
+        nn.weights=[own_weights[0]]+weights.arrays
+        nn.batch_size=batch_size
+        layers=len(nn.sizes)-1
+        total=[np.empty(w.shape,dtype=nn.dtype) for w in nn.weights[1:]]
+        timer=Timer(nn.timer_interval)
+        start_time=time.time()
+
+        nn.sampler=EpochSampler(len(X),batch_size)
+        for trial,batch in nn.sampler.batches(trial_count):
+            i=trial+len(batch)-1
+            if nn.verbose:
+                nn.tick(timer,i,trial_count,start_time)
+            np.copyto(indices.arrays[0][:len(batch)],batch)
+            stop=0
+            for connection,count in zip(connections,split_trials(len(batch),workers)):
+                connection.send((stop,stop+count))
+                stop+=count
+            for connection in connections:
+                connection.recv()
+
+            for j in range(layers):
+                np.copyto(total[j],adjustments.arrays[j])
+                for k in range(1,workers):
+                    total[j]+=adjustments.arrays[k*layers+j]
+            nn.adjust_weights(total,nn.get_learning_rate(i,trial_count))
+        duration=time.time()-start_time
+
+        for target,source in zip(own_weights[1:],weights.arrays):
+            np.copyto(target,source)
+    finally:
+        nn.weights=own_weights
+        for connection in connections:
+            try:
+                connection.send(None)
+            except OSError:
+                pass
+        for process in processes:
+            process.join()
+        weights.close()
+        data.close()
+        targets.close()
+        indices.close()
+        adjustments.close()
+
+    if nn.verbose:
+        timer.stop("Data parallel training")
+    return trial_count/duration
+
+def hogwild_scaling(X,Y,sizes,trial_count,worker_counts,batch_size=1,**hyperparameters):
+    #trains a copy of the same initial net once per worker count, and reports samples per second,
+    #speed-up over the first worker count and training accuracy for each
+    initial=NeuralNet(sizes,**hyperparameters)
+    results=[]
+    for workers in worker_counts:
+        nn=NeuralNet(sizes,**hyperparameters)
+        for target,source in zip(nn.weights,initial.weights):
+            np.copyto(target,source)
+        throughput=train_hogwild(nn,X,Y,trial_count,workers,batch_size=batch_size)
+        accuracy=nn.get_error_report("train",X,Y)["train accuracy"]
+        results.append({"workers":workers,"samples per second":throughput,"train accuracy":accuracy,
+                "speed-up":throughput/results[0]["samples per second"] if results else 1.0})
+
+    for result in results:
+        print_color("%s WORKERS"%result["workers"],COLORS.GREEN)
+        print_color("%s samples/s (x%s), train accuracy %s"%(round(result["samples per second"]),
+            round(result["speed-up"],2),round(result["train accuracy"],4)),COLORS.YELLOW)
+    return results
@@ -0,0 +1,140 @@
+import json, math, os, time
+from utilities import *
+from constants import *
+
+#nested timing spans for the hot paths. code is instrumented once with `with PROFILER.span("name"):`,
+#and while the profiler is disabled span returns one shared do-nothing context, so instrumented code costs
+#a method call per span. spans are aggregated per path, like "train/mini_batch/forward", into counts, totals
+#and latency histograms, and the first max_events spans are also kept as events for a Chrome trace.
+#spans are meant for one thread, the main one
+
+#histogram bucket k counts the spans that took from 2**(k-1) to 2**k microseconds, bucket 0 the faster ones
+BUCKETS=40
+
+class NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exception):
+        return False
+
+NULL_SPAN=NullSpan()
+
+class Span:
+    __slots__=("profiler","name","start")
+
+    def __init__(self,profiler,name):
+        self.profiler=profiler
+        self.name=name
+
+    def __enter__(self):
+        self.profiler.stack.append(self.name)
+        self.start=time.perf_counter()
+        return self
+
+    def __exit__(self,*exception):
+        end=time.perf_counter()
+        profiler=self.profiler
+        profiler.record("/".join(profiler.stack),self.start,end)
+        profiler.stack.pop()
+        return False
+
+class SpanStats:
+    __slots__=("count","total","shortest","longest","histogram")
+
+    def __init__(self):
+        self.count=0
+        self.total=0.0
+        self.shortest=math.inf
+        self.longest=0.0
+        self.histogram=[0]*BUCKETS
+
+    def add(self,duration):
+        self.count+=1
+        self.total+=duration
+        if duration<self.shortest:
+            self.shortest=duration
+        if duration>self.longest:
+            self.longest=duration
+        self.histogram[min(int(duration*1e6).bit_length(),BUCKETS-1)]+=1
+
+    def percentile(self,fraction):
+        #an upper bound from the histogram, in seconds
+        seen=0
+        for k,count in enumerate(self.histogram):
+            seen+=count
+            if seen>=fraction*self.count:
+                return min(2**k/1e6,self.longest)
+        return self.longest
+
+class Profiler:
+    def __init__(self,enabled=False,max_events=100000):
+        self.max_events=max_events
+        self.enabled=enabled
+        self.reset()
+
+    def reset(self):
+        self.stack=[]
+        self.stats={}
+        self.events=[]
+        self.origin=time.perf_counter()
+
+    def enable(self):
+        self.enabled=True
+
+    def disable(self):
+        self.enabled=False
+
+    def span(self,name):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self,name)
+
+    def record(self,path,start,end):
+        stats=self.stats.get(path)
+        if stats is None:
+            stats=self.stats[path]=SpanStats()
+        stats.add(end-start)
+        if len(self.events)<self.max_events:
+            self.events.append((path,start,end))
+
+    def get_trace(self):
+        #the events in Chrome's trace event format, for chrome://tracing or https://ui.perfetto.dev
+        pid=os.getpid()
+        events=[{"name":path.rsplit("/",1)[-1],
+                "cat":path,
+                "ph":"X",
+                "ts":(start-self.origin)*1e6,
+                "dur":(end-start)*1e6,
+                "pid":pid,
+                "tid":0} for path,start,end in self.events]
+        return {"traceEvents":events,"displayTimeUnit":"ms"}
+
+    def write_trace(self,path):
+        folder=os.path.dirname(path)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+        with open(path,"w") as f:
+            json.dump(self.get_trace(),f)
+
+    def get_summary(self):
+        #one row per span path, parents right before their children: path, count, total seconds, mean,
+        #median and 99th percentile milliseconds, and the share of the total of the top level spans
+        top=sum(stats.total for path,stats in self.stats.items() if "/" not in path) or 1.0
+        rows=[]
+        for path in sorted(self.stats,key=lambda path:path.split("/")):
+            stats=self.stats[path]
+            rows.append((path,stats.count,stats.total,1000*stats.total/stats.count,1000*stats.percentile(0.5),
+                    1000*stats.percentile(0.99),stats.total/top))
+        return rows
+
+    def report(self):
+        print_color("%-40s %9s %10s %10s %10s %10s %7s"%("SPAN","COUNT","TOTAL S","MEAN MS","P50 MS","P99 MS","SHARE"),
+                COLORS.GREEN)
+        for path,count,total,mean,median,p99,share in self.get_summary():
+            #children are indented under their parents
+            name="  "*path.count("/")+path.rsplit("/",1)[-1]
+            print_color("%-40s %9s %10.3f %10.4f %10.4f %10.4f %6.1f%%"%(name,count,total,mean,median,p99,100*share),
+                    COLORS.YELLOW)
+
+PROFILER=Profiler()
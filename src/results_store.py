@@ -0,0 +1,62 @@
+import json, sqlite3, time
+
+#sweep results in an sqlite database: one row per trained net, with its hyperparameters, accuracies and
+#duration. sqlite locks the file itself, so several sweeps can write to the same database at once, and
+#results can be queried with plain sql, for example
+#sqlite3 logs/sweep.db "select * from results order by valid_accuracy desc limit 10"
+
+COLUMNS=[("sweep","TEXT"),
+        ("finished","TEXT"),
+        ("sizes","TEXT"),
+        ("learning_rate","REAL"),
+        ("final_learning_rate","REAL"),
+        ("batch_size","INTEGER"),
+        ("optimizer","TEXT"),
+        ("activation","TEXT"),
+        ("output","TEXT"),
+        ("trials","INTEGER"),
+        ("seed","INTEGER"),
+        ("train_accuracy","REAL"),
+        ("valid_accuracy","REAL"),
+        ("duration","REAL"),
+        ("error","TEXT")]
+
+class ResultsStore:
+    def __init__(self,path,timeout=60):
+        #timeout is how many seconds to wait for another process that is writing
+        self.path=path
+        self.connection=sqlite3.connect(path,timeout=timeout)
+        #readers don't block the writer
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        with self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS results (id INTEGER PRIMARY KEY, %s)"%(
+                ", ".join("%s %s"%column for column in COLUMNS)))
+            self.connection.execute("CREATE INDEX IF NOT EXISTS results_sweep ON results (sweep)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS results_valid_accuracy ON results (valid_accuracy)")
+
+    def add(self,result):
+        #where result is a dict with some or all of COLUMNS. lists like sizes are stored as json
+        result=dict(result,finished=result.get("finished",time.strftime("%Y-%m-%d %H:%M:%S")))
+        values=[result.get(name) for name,kind in COLUMNS]
+        values=[json.dumps(v) if isinstance(v,(list,tuple)) else v for v in values]
+        with self.connection:
+            self.connection.execute("INSERT INTO results (%s) VALUES (%s)"%(
+                ", ".join(name for name,kind in COLUMNS),", ".join("?"*len(COLUMNS))),values)
+
+    def best(self,sweep=None,count=10,key="valid_accuracy"):
+        #the count results with the highest key, of one sweep or of all of them, as dicts
+        if key not in [name for name,kind in COLUMNS]:
+            raise ValueError("Unknown results column '%s'"%key)
+        query="SELECT * FROM results WHERE error IS NULL"
+        parameters=[]
+        if sweep is not None:
+            query+=" AND sweep=?"
+            parameters.append(sweep)
+        query+=" ORDER BY %s DESC, duration LIMIT ?"%key
+        parameters.append(count)
+        cursor=self.connection.execute(query,parameters)
+        names=[description[0] for description in cursor.description]
+        return [dict(zip(names,row)) for row in cursor.fetchall()]
+
+    def close(self):
+        self.connection.close()
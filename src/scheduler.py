@@ -0,0 +1,95 @@
+import math, random, time
+import numpy as np
+from neural_net import NeuralNet
+
+#successive halving: many configs are trained on a small budget of trials and scored on the validation data,
+#and only the best 1/eta of them keep training, from their current weights, up to an eta times bigger budget,
+#until max_trials is reached, and the last config left trains straight to max_trials. bad configs are
+#usually obvious long before max_trials, so this trains a fraction of the trials of running every config
+#to the end.
+#hyperband runs several brackets of successive halving, from many configs starting on min_trials to a few
+#trained on max_trials from the start, for when it is unknown how early bad configs can be told apart.
+#a step of a schedule is (config, net, first trial, stop trial, trial count), where config has the keys of
+#make_net plus a seed, net is None before the first step, and trial count is the budget the learning rate
+#schedule runs over. steps are run by a run_step(step) function that returns (net, result), like train_step
+
+def make_net(config):
+    return NeuralNet(config["sizes"],learning_rate=config["learning_rate"],
+            final_learning_rate=config.get("final_learning_rate",-1),dtype=config.get("dtype",float),
+            optimizer=config.get("optimizer","sgd"),activation=config.get("activation","tanh"),
+            output=config.get("output","tanh"))
+
+def train_step(step,X,Y,valid_X,valid_Y):
+    #returns (net, result), where result is the config with the first trial, the trials trained so far, the
+    #accuracies and the duration of this step, or with the error if it failed, and then net is None
+    config,net,first_trial,stop_trial,trial_count=step
+    result=dict(config,first_trial=first_trial,trials=stop_trial)
+    try:
+        #every step is seeded, so results don't depend on which process ran the step before
+        seed=config.get("seed",0)
+        random.seed("%s-%s"%(seed,first_trial))
+        np.random.seed([seed,first_trial])
+        if net is None:
+            net=make_net(config)
+        start_time=time.time()
+        net.train(X,Y,trial_count,batch_size=config.get("batch_size",1),first_trial=first_trial,
+                stop_trial=stop_trial)
+        result["duration"]=time.time()-start_time
+        result["train_accuracy"]=net.get_accuracy(X,Y)
+        if len(valid_X):
+            result["valid_accuracy"]=net.get_accuracy(valid_X,valid_Y)
+    except Exception as e:
+        result["error"]="%s: %s"%(type(e).__name__,e)
+        net=None
+    return net,result
+
+def get_score(result):
+    #the validation accuracy, or the training accuracy without validation data
+    return result.get("valid_accuracy",result.get("train_accuracy"))
+
+def get_rungs(config_count,min_trials,max_trials,eta=3):
+    #returns (configs trained, trials trained so far) of every rung of successive halving. the last rung
+    #always trains to max_trials, once a single config is left it goes there in one step
+    rungs=[]
+    count=config_count
+    trials=min_trials if count>1 else max_trials
+    while True:
+        rungs.append((count,min(int(round(trials)),max_trials)))
+        if trials>=max_trials:
+            return rungs
+        count=max(int(count/eta),1)
+        trials=trials*eta if count>1 else max_trials
+
+def successive_halving(configs,run_step,min_trials,max_trials,eta=3,map_function=map,report=None):
+    #map_function runs the steps of a rung, and can be a pool's imap to run them in parallel.
+    #report(result) is called with every result, as they come in.
+    #returns (result, net) of the configs of the last rung, best first
+    survivors=[(config,None,0) for config in configs]
+    finished=[]
+    for count,trials in get_rungs(len(configs),min_trials,max_trials,eta):
+        steps=[(config,net,done,trials,max_trials) for config,net,done in survivors[:count]]
+        scored=[]
+        for step,(net,result) in zip(steps,map_function(run_step,steps)):
+            if report:
+                report(result)
+            if "error" not in result:
+                scored.append((step[0],net,result))
+        #sorting is stable, so ties keep the order of configs
+        scored.sort(key=lambda item:-get_score(item[2]))
+        survivors=[(config,net,trials) for config,net,result in scored]
+        finished=[(result,net) for config,net,result in scored]
+    return finished
+
+def get_brackets(min_trials,max_trials,eta=3):
+    #returns (config count, min trials) of every hyperband bracket, the one with the most configs first
+    s_max=int(math.log(max_trials/min_trials,eta)+1e-9)
+    return [(int(math.ceil((s_max+1)/(s+1)*eta**s)),max_trials/eta**s) for s in range(s_max,-1,-1)]
+
+def hyperband(sample,run_step,min_trials,max_trials,eta=3,map_function=map,report=None):
+    #sample(count) returns count configs for a bracket, usually drawn at random from a search space.
+    #returns (result, net) of the last rung of every bracket, best first
+    finished=[]
+    for count,trials in get_brackets(min_trials,max_trials,eta):
+        finished+=successive_halving(sample(count),run_step,trials,max_trials,eta,map_function,report)
+    finished.sort(key=lambda item:-get_score(item[0]))
+    return finished
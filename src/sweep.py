@@ -0,0 +1,198 @@
+"""
+Hyperparameter sweep: trains one net per combination of the given values on a pool of processes, and
+writes every result to an sqlite database, see results_store.py. The data is loaded once, into shared
+memory that every process reads.
+With --eta, the combinations are trained by successive halving instead, see scheduler.py: all of them
+start on --min-trials trials, and only the best 1/eta keep training, up to the largest of --trials.
+Hyperband also tries random combinations with fewer and fewer of them starting on bigger budgets.
+
+Usage:
+  sweep.py <train-csv> <prediction-csv> [options]
+
+Values are separated by commas, except for sizes and activations, which are separated by semicolons.
+
+Options:
+    --sizes=<values>       Layer sizes, like 2,10,1;2,20,1 [default: 2,2,1]
+    --learn-rate=<values>  Learning rates. [default: 0.1]
+    --final-learn-rate=<values>  Final learning rates, -1 means no change. [default: -1]
+    --batch=<values>       Mini-batch sizes. [default: 1]
+    --optimizer=<values>   Optimizers. [default: sgd]
+    --activation=<values>  Activations of the hidden layers, like relu;tanh,relu [default: tanh]
+    --output=<values>      Activations of the output layer. [default: tanh]
+    --trials=<values>      Trial counts. [default: 10000]
+    --seeds=<count>        Train every combination with this many seeds. [default: 1]
+    --dtype=<dtype>        float32 or float64. [default: float64]
+    --normalize            Subtract the mean and divide by the standard deviation for all of X.
+    --validation-ratio=<r>  Number from 0 to 1, the share of the data used for training. [default: 0.8]
+
+    --processes=<count>    Number of processes training at once, 0 means one per cpu. [default: 0]
+    --db=<path>            The sqlite database. [default: logs/sweep.db]
+    --name=<name>          Name of this sweep in the database, the start time by default.
+    --top=<count>          Show this many of the best results at the end. [default: 10]
+
+    --eta=<ratio>          Train by successive halving, keeping the best 1/eta of the nets after every rung.
+    --min-trials=<count>   With --eta, the trials of the first rung. [default: 1000]
+    --hyperband            With --eta, run hyperband brackets on random combinations.
+
+    -h --help              Show this screen.
+"""
+
+import itertools, multiprocessing, os, random, time
+import numpy as np
+from docopt import docopt
+from constants import *
+from utilities import *
+from neural_net import NeuralNet
+from parallel import SharedArrays
+from results_store import ResultsStore
+import scheduler
+
+#the shared data of a pool process, attached once by attach_data
+DATA=None
+
+def get_configs(grids,seeds):
+    #every combination of the values in grids, a dict of option name to list of values, once per seed
+    names=sorted(grids)
+    configs=[]
+    for values in itertools.product(*[grids[name] for name in names]):
+        for seed in range(seeds):
+            configs.append(dict(zip(names,values),seed=seed))
+    return configs
+
+def attach_data(spec):
+    global DATA
+    DATA=SharedArrays.attach(spec)
+
+def run_step(step):
+    #one step of a schedule on the shared data, see scheduler.py
+    return scheduler.train_step(step,*DATA.arrays)
+
+def run_config(config):
+    #trains one net on all of its trials. returns config with the results, or with the error if it failed
+    net,result=run_step((config,None,0,config["trials"],config["trials"]))
+    return result
+
+def run_sweep(data,configs,processes,store,name):
+    #data is (X_train, Y_train, X_valid, Y_valid). results are added to store as soon as they are done.
+    #returns the number of failed configs
+    shared=SharedArrays.copy_of(data,np.float64)
+    failed=0
+    try:
+        with multiprocessing.Pool(processes,initializer=attach_data,initargs=(shared.spec(),)) as pool:
+            for k,result in enumerate(pool.imap_unordered(run_config,configs)):
+                store.add(dict(result,sweep=name))
+                if "error" in result:
+                    failed+=1
+                    print_color("%s/%s failed: %s"%(k+1,len(configs),result["error"]),COLORS.RED)
+                else:
+                    print_color("%s/%s done: %s valid accuracy, %s seconds"%(k+1,len(configs),
+                        result.get("valid_accuracy"),round(result["duration"],1)),COLORS.YELLOW)
+    finally:
+        shared.close()
+    return failed
+
+def run_halving(data,configs,processes,store,name,min_trials,max_trials,eta,hyperband=False):
+    #like run_sweep, but by successive halving or hyperband. nets go to the pool and back for every rung.
+    #returns the (result, net) of the last rungs, best first, and the number of trials trained
+    shared=SharedArrays.copy_of(data,np.float64)
+    trials=[0]
+    def report(result):
+        store.add(dict(result,sweep=name))
+        if "error" in result:
+            print_color("Failed: %s"%result["error"],COLORS.RED)
+        else:
+            trials[0]+=result["trials"]-result.get("first_trial",0)
+            print_color("%s trials: %s score, sizes %s, lr %s, batch %s"%(result["trials"],
+                scheduler.get_score(result),result["sizes"],result["learning_rate"],result["batch_size"]),COLORS.YELLOW)
+    try:
+        with multiprocessing.Pool(processes,initializer=attach_data,initargs=(shared.spec(),)) as pool:
+            if hyperband:
+                sample=lambda count:random.sample(configs,min(count,len(configs)))
+                finished=scheduler.hyperband(sample,run_step,min_trials,max_trials,eta,pool.imap,report)
+            else:
+                finished=scheduler.successive_halving(configs,run_step,min_trials,max_trials,eta,pool.imap,report)
+    finally:
+        shared.close()
+    return finished,trials[0]
+
+def parse_grids(args):
+    #returns the grids for get_configs, raises ValueError for bad values
+    grids={"sizes":[[int(i) for i in sizes.split(",")] for sizes in args["--sizes"].split(";")],
+            "learning_rate":[float(i) for i in args["--learn-rate"].split(",")],
+            "final_learning_rate":[float(i) for i in args["--final-learn-rate"].split(",")],
+            "batch_size":[int(i) for i in args["--batch"].split(",")],
+            "optimizer":args["--optimizer"].split(","),
+            "activation":[a.split(",") if "," in a else a for a in args["--activation"].split(";")],
+            "output":args["--output"].split(","),
+            "trials":[int(i) for i in args["--trials"].split(",")],
+            "dtype":[args["--dtype"]]}
+    return grids
+
+def main(args):
+    for path in (args["<train-csv>"],args["<prediction-csv>"]):
+        if not os.path.isfile(path):
+            print_color("Not a file: '%s'"%path,COLORS.RED)
+            return
+
+    try:
+        grids=parse_grids(args)
+        seeds=int(args["--seeds"])
+        validation_ratio=float(args["--validation-ratio"])
+        processes=int(args["--processes"]) or None
+        top=int(args["--top"])
+        eta=float(args["--eta"]) if args["--eta"] else None
+        min_trials=int(args["--min-trials"])
+    except ValueError:
+        print_color("Bad value for an option.",COLORS.RED)
+        return
+
+    random.seed(123)
+    np.random.seed(123)
+    X_train,Y_train,X_valid,Y_valid=get_data_2csv(args["<train-csv>"],args["<prediction-csv>"],
+            validation_ratio,normalize=args["--normalize"])
+    bad=[sizes for sizes in grids["sizes"] if sizes[0]!=X_train.shape[1]]
+    if bad:
+        print_color("Bad sizes for this input data, sizes[0] must be %s: %s"%(X_train.shape[1],bad),COLORS.RED)
+        return
+    if eta is not None:
+        if eta<=1 or min_trials<1:
+            print_color("--eta must be more than 1 and --min-trials at least 1.",COLORS.RED)
+            return
+        #every net trains up to the largest trial count, the schedule decides which ones get there
+        max_trials=max(grids.pop("trials"))
+        min_trials=min(min_trials,max_trials)
+
+    configs=get_configs(grids,seeds)
+    name=args["--name"] or time.strftime("%Y-%m-%d %H:%M:%S")
+    folder=os.path.dirname(args["--db"])
+    if folder:
+        os.makedirs(folder,exist_ok=True)
+    store=ResultsStore(args["--db"])
+    print_color("Sweep '%s': %s configs on %s processes."%(name,len(configs),processes or os.cpu_count()),
+            COLORS.GREEN)
+    try:
+        if eta is not None:
+            finished,trials=run_halving((X_train,Y_train,X_valid,Y_valid),configs,processes,store,name,
+                    min_trials,max_trials,eta,args["--hyperband"])
+            print_color("Trained %s trials, %s%% of training every config for %s trials."%(trials,
+                    round(100*trials/(len(configs)*max_trials),1),max_trials),COLORS.GREEN)
+            #the store has the early rungs too, their accuracies aren't comparable
+            best=[result for result,net in finished[:top]]
+        else:
+            failed=run_sweep((X_train,Y_train,X_valid,Y_valid),configs,processes,store,name)
+            if failed:
+                print_color("%s configs failed."%failed,COLORS.RED)
+            best=store.best(name,top,"valid_accuracy" if len(X_valid) else "train_accuracy")
+
+        print_color("BEST %s"%top,COLORS.GREEN)
+        for result in best:
+            print_color("%s valid, %s train: sizes %s, lr %s, final lr %s, batch %s, %s, %s/%s, %s trials, seed %s"%(
+                result.get("valid_accuracy"),result["train_accuracy"],result["sizes"],result["learning_rate"],
+                result["final_learning_rate"],result["batch_size"],result["optimizer"],result["activation"],
+                result["output"],result["trials"],result["seed"]),COLORS.YELLOW)
+    finally:
+        store.close()
+
+if __name__ == "__main__":
+    args = docopt(__doc__)
+    main(args)
@@ -0,0 +1,65 @@
+import unittest, random
+
+from neural_net import NeuralNet as NN
+from activations import *
+from utilities import *
+
+import numpy as np
+
+random.seed(123)
+np.random.seed(123)
+
+class TestActivations(unittest.TestCase):
+
+    def test_derivatives_from_outputs(self):
+        x=np.random.randn(6,5)
+        for name in ("tanh","logistic","relu","leaky_relu"):
+            activation=get_activation(name)
+            y=activation.forward(x)
+            h=1e-6
+            numeric=(activation.forward(x+h)-activation.forward(x-h))/(2*h)
+            self.assertTrue(np.allclose(activation.derivative(y),numeric,atol=1e-5),name)
+
+            #in place, like the workspace does it
+            out=np.empty_like(x)
+            activation.forward(x,out=out)
+            self.assertTrue(np.allclose(out,y),name)
+            activation.derivative(out,out=out)
+            self.assertTrue(np.allclose(out,numeric,atol=1e-5),name)
+
+    def test_softmax(self):
+        x=np.random.randn(4,3)*50
+        y=get_activation("softmax").forward(x)
+        self.assertTrue(np.allclose(y.sum(axis=1),1))
+        self.assertTrue(np.array_equal(y.argmax(axis=1),x.argmax(axis=1)))
+
+    def test_per_layer_activations(self):
+        nn=NN([3,6,5,4],verbose=0,activation=["relu","logistic"],output="leaky_relu")
+        self.assertEqual([f.name for f in nn.functions[1:]],["relu","logistic","leaky_relu"])
+        X=np.random.random((7,3))
+        Y=np.random.random((7,4))
+        expected=[np.zeros(w.shape) for w in nn.weights[1:]]
+        for i in range(len(X)):
+            nn.forward(X[i])
+            for j,adj in enumerate(nn.get_adjustments(Y[i])):
+                expected[j]+=adj
+        nn.forward_rows(X)
+        for adj,exp in zip(nn.get_batch_adjustments(Y),expected):
+            self.assertTrue(np.allclose(adj,exp))
+
+    def test_relu_trains(self):
+        X,Y,a,b=get_data_1csv("tests/3outputs2bools.csv",1)
+        nn=NN([2,20,3],verbose=0,learning_rate=0.05,activation="relu",output="softmax")
+        nn.train(X,Y,3000,batch_size=4)
+        self.assertEqual(nn.get_accuracy(X,Y),1.0)
+
+    def test_bad_activations(self):
+        with self.assertRaises(ValueError):
+            NN([2,3,1],activation="sine")
+        with self.assertRaises(ValueError):
+            NN([2,3,3],activation="softmax")
+        with self.assertRaises(ValueError):
+            NN([2,3,4,1],activation=["relu"])
+
+if __name__=="__main__":
+    unittest.main()
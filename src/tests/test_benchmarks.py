@@ -0,0 +1,30 @@
+import unittest, random
+
+from benchmarks.throughput import run_benchmarks, compare, BENCHMARKS
+
+import numpy as np
+
+random.seed(123)
+np.random.seed(123)
+
+class TestBenchmarks(unittest.TestCase):
+
+    def test_run_benchmarks(self):
+        results=run_benchmarks([[3,4,2]],[1,8],BENCHMARKS,2,0.0,32,"float64")
+        #mini_batch and train once per batch size
+        self.assertEqual(len(results),3+2*2)
+        for result in results:
+            self.assertEqual(len(result["runs"]),2)
+            self.assertGreater(result["samples per second"],0)
+
+    def test_compare(self):
+        def result(name,rate):
+            return {"name":name,"sizes":[3,4,2],"batch size":None,"samples per second":rate}
+        baseline=[result("forward",100.0),result("evaluate",100.0)]
+        ratios,regressions=compare([result("forward",95.0),result("evaluate",80.0),result("backward",1.0)],
+                baseline,0.1)
+        self.assertEqual(ratios,[(("forward",(3,4,2),None),0.95),(("evaluate",(3,4,2),None),0.8)])
+        self.assertEqual(regressions,[(("evaluate",(3,4,2),None),0.8)])
+
+if __name__=="__main__":
+    unittest.main()
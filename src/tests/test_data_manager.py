@@ -2,8 +2,10 @@ __author__ = 'Charlie'
 
 
 import unittest
+import pickle
 import data_manager
 import numpy as np
+from neural_net import NeuralNet
 
 
 class TestDataManager(unittest.TestCase):
@@ -38,6 +40,24 @@ class TestDataManager(unittest.TestCase):
         self.assertTrue(np.array_equal(rotated_imgs, expected_rotated_imgs))
         self.assertTrue(np.array_equal(rotated_clss, expected_rotated_clss))
 
+    def test_generate_other_rotations(self):
+        imgs = np.random.random_sample((5, 9, 9))
+        clss = np.arange(5)
+
+        rotated_imgs, rotated_clss = data_manager.generate_rotated_images(imgs, clss, 2)
+        self.assertTrue(np.array_equal(rotated_imgs[1::2], imgs[:, ::-1, ::-1]))
+        self.assertTrue(np.array_equal(rotated_clss, np.repeat(clss, 2)))
+
+        # 60 degrees is interpolated, but the 180 degrees among them is close to exact
+        rotated_imgs, rotated_clss = data_manager.generate_rotated_images(imgs, clss, 6, chunk_size=2)
+        self.assertEqual(rotated_imgs.shape, (30, 9, 9))
+        self.assertTrue(np.allclose(rotated_imgs[::6], imgs))
+        self.assertTrue(np.allclose(rotated_imgs[3::6], imgs[:, ::-1, ::-1]))
+        in_processes, _ = data_manager.generate_rotated_images(imgs, clss, 6, processes=2, chunk_size=2)
+        self.assertTrue(np.array_equal(rotated_imgs, in_processes))
+
+        self.assertRaises(ValueError, data_manager.generate_rotated_images, np.zeros((2, 3, 4)), clss[:2])
+
     def test_trim_edges(self):
         img = np.reshape(np.array(range(25)), (5, 5))
 
@@ -53,3 +73,119 @@ class TestDataManager(unittest.TestCase):
         expected_trim_edge_by_two = np.array([[12]])
         trimmed_by_two = data_manager.trim_edges(img, 2, 2, 2, 2)
         self.assertTrue(np.array_equal(expected_trim_edge_by_two, trimmed_by_two))
+
+    def test_filter_images(self):
+        imgs = np.zeros((2, 7, 7), dtype=np.uint8)
+        imgs[0, 3, 3] = 100
+        imgs[1] = np.arange(49).reshape(7, 7) * 5
+
+        # the same as PIL's ImageFilter.EMBOSS: the edges are left alone, and the kernel is applied bottom up
+        embossed = data_manager.filter_images(imgs, ['emboss'])
+        expected_embossed = np.full((7, 7), 128, dtype=np.uint8)
+        expected_embossed[[0, -1], :] = 0
+        expected_embossed[:, [0, -1]] = 0
+        expected_embossed[2, 4] = 28
+        expected_embossed[3, 3] = 228
+        self.assertTrue(np.array_equal(embossed[0], expected_embossed))
+        self.assertTrue(np.array_equal(embossed[1, 1:-1, 1:-1], np.full((5, 5), 98)))
+
+        # blurring a gradient changes nothing
+        self.assertTrue(np.array_equal(data_manager.filter_images(imgs[1:], ['blur']), imgs[1:]))
+
+        # other types are scaled to 0-255 per image first
+        binary = (imgs > 50).astype(np.uint8)
+        scaled = data_manager.filter_images(binary.astype(np.float32) / 10, ['emboss'])
+        self.assertTrue(np.array_equal(scaled, data_manager.filter_images(binary * 255, ['emboss'])))
+
+    def test_filter_images_processes(self):
+        imgs = (np.random.random_sample((5, 12, 12)) * 255).astype(np.uint8)
+        filtered = data_manager.filter_images(imgs, ['emboss', 'blur'])
+        self.assertTrue(np.array_equal(filtered, data_manager.filter_images(imgs, ['emboss', 'blur'], 2)))
+
+    def test_generate_trimmed_images(self):
+        imgs = np.arange(3 * 48 * 48).reshape(3, 48, 48)
+        trimmed = data_manager.generate_trimmed_images(imgs, 5, 5, 5, 5)
+        self.assertEqual(trimmed.shape, (3, 38, 38))
+        self.assertTrue(np.shares_memory(trimmed, imgs))
+        self.assertTrue(np.array_equal(trimmed[1], data_manager.trim_edges(imgs[1], 5, 5, 5, 5)))
+
+        uneven = data_manager.generate_trimmed_images(imgs, 1, 2, 0, 3, copy=True)
+        self.assertEqual(uneven.shape, (3, 47, 43))
+        self.assertTrue(uneven.flags['C_CONTIGUOUS'])
+        self.assertFalse(np.shares_memory(uneven, imgs))
+        self.assertEqual(uneven[2, 0, 0], imgs[2, 1, 2])
+        self.assertEqual(uneven[2, -1, -1], imgs[2, -1, -4])
+
+    def test_augmented_images(self):
+        imgs = np.random.random_sample((6, 9, 9))
+        clss = np.arange(6)
+        augmented = data_manager.AugmentedImages(imgs, clss, edge=1, mean=0.5, std=2.0, dtype=np.float64)
+        self.assertEqual(len(augmented), 24)
+        self.assertEqual(augmented.shape, (24, 49))
+
+        # the same samples as rotating and trimming all the images up front
+        rotated_imgs, rotated_clss = data_manager.generate_rotated_images(
+            data_manager.generate_trimmed_images(imgs, 1, 1, 1, 1), clss)
+        indices = np.array([23, 0, 5, 6, 14])
+        batch, batch_clss = augmented.get_batch(indices)
+        self.assertTrue(np.allclose(batch, (rotated_imgs[indices] - 0.5) / 2.0))
+        self.assertTrue(np.array_equal(batch_clss, rotated_clss[indices]))
+        self.assertTrue(np.array_equal(augmented.labels(), rotated_clss))
+        self.assertEqual(augmented.get_rows(indices).shape, (5, 49))
+
+        trimmed = data_manager.generate_trimmed_images(imgs, 1, 1, 1, 1)
+        mean, std = augmented.get_stats(chunk_size=4)
+        self.assertAlmostEqual(mean, trimmed.mean())
+        self.assertAlmostEqual(std, trimmed.std())
+
+    def test_pickle_augmented_images(self):
+        # the images are left out, so a pickled model doesn't carry the data set
+        imgs = np.random.random_sample((200, 20, 20))
+        augmented = data_manager.AugmentedImages(imgs, np.arange(200), edge=2, mean=0.5, std=2.0)
+        copy = pickle.loads(pickle.dumps(augmented, -1))
+        self.assertLess(len(pickle.dumps(augmented, -1)), imgs.nbytes // 100)
+        self.assertIsNone(copy.images)
+        self.assertEqual((copy.image_shape, copy.mean, copy.std), ((16, 16), 0.5, 2.0))
+        self.assertIs(augmented.images, imgs)
+
+    def test_random_augmented_images(self):
+        imgs = np.random.random_sample((6, 9, 9))
+        augmented = data_manager.AugmentedImages(imgs, np.arange(6), edge=2, random=True, shift=True, seed=4)
+        self.assertEqual(len(augmented), 6)
+        first = [augmented.get_batch(np.arange(6))[0] for epoch in range(3)]
+        self.assertFalse(np.array_equal(first[0], first[1]))
+        augmented.reset()
+        again = [augmented.get_batch(np.arange(6))[0] for epoch in range(3)]
+        self.assertTrue(all(np.array_equal(a, b) for a, b in zip(first, again)))
+
+        # every sample is a rotation of a 5x5 crop of its image
+        for index, sample in enumerate(first[0]):
+            crops = [np.rot90(imgs[index, top:top + 5, left:left + 5], turn).astype(np.float32)
+                     for top in range(5) for left in range(5) for turn in range(4)]
+            self.assertTrue(any(np.array_equal(sample, crop) for crop in crops))
+
+    def test_train_on_augmented_images(self):
+        # bright images are class 1, dark ones class 0, whichever way they are turned
+        imgs = np.random.random_sample((40, 6, 6))
+        clss = np.arange(40) % 2
+        imgs[clss == 1] += 1
+        augmented = data_manager.AugmentedImages(imgs, clss, edge=1, random=True, seed=1)
+        nn = NeuralNet([16, 8, 2], learning_rate=0.05)
+        nn.train(augmented, augmented.labels(), 2000, batch_size=8)
+        rows = augmented.get_rows(np.arange(40))
+        self.assertGreater(nn.get_accuracy(rows, clss), 0.9)
+
+    def test_validate_on_augmented_images(self):
+        # the samples are predicted a chunk at a time, so augmented images can be the validation data
+        imgs = np.random.random_sample((40, 6, 6))
+        clss = np.arange(40) % 2
+        imgs[clss == 1] += 1
+        train = data_manager.AugmentedImages(imgs[:30], clss[:30], edge=1, random=True, seed=1)
+        valid = data_manager.AugmentedImages(imgs[30:], clss[30:], edge=1)
+        nn = NeuralNet([16, 8, 2], learning_rate=0.05)
+        nn.train(train, train.labels(), 2000, batch_size=8, valid_X=valid, valid_Y=valid.labels(),
+                 eval_interval=500)
+        self.assertEqual(len(nn.history), 4)
+        rows = valid.get_rows(np.arange(len(valid)))
+        self.assertTrue(np.array_equal(nn.predict(valid, chunk_size=7), nn.predict(rows)))
+        self.assertEqual(nn.get_accuracy(valid, valid.labels()), nn.get_accuracy(rows, valid.labels()))
@@ -0,0 +1,72 @@
+import unittest, os, tempfile, time
+
+from disk_cache import DiskCache
+
+import numpy as np
+
+
+class TestDiskCache(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.cache = DiskCache(os.path.join(self.folder.name, 'cache'))
+        self.source = os.path.join(self.folder.name, 'source.txt')
+        with open(self.source, 'w') as f:
+            f.write('1')
+        self.calls = []
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def load(self, count, scale=2):
+        self.calls.append((count, scale))
+        return np.arange(count) * scale, np.ones((count, 2))
+
+    def test_cached(self):
+        load = self.cache.cached(sources=[self.source])(self.load)
+        X, Y = load(5)
+        self.assertTrue(np.array_equal(X, np.arange(5) * 2))
+        self.assertIsInstance(X, np.memmap)
+        # results are read-only, so no caller can change them for the others
+        self.assertRaises(ValueError, X.__setitem__, 0, 42)
+
+        # defaults and keywords make the same key
+        load(5, 2)
+        load(count=5)
+        self.assertEqual(len(self.calls), 1)
+        load(5, scale=3)
+        self.assertEqual(len(self.calls), 2)
+
+        # a new process would find the result on disk
+        other = DiskCache(self.cache.folder).cached(sources=[self.source])(self.load)
+        X, Y = other(5)
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(Y.shape, (5, 2))
+
+        # a changed source file is a new key
+        time.sleep(0.01)
+        with open(self.source, 'w') as f:
+            f.write('22')
+        load(5)
+        self.assertEqual(len(self.calls), 3)
+
+    def test_single_array(self):
+        load = self.cache.cached()(lambda count: np.zeros(count))
+        self.assertEqual(load(3).shape, (3,))
+        self.assertEqual(load(3).shape, (3,))
+
+    def test_evict(self):
+        self.cache.max_bytes = 2500
+        load = self.cache.cached()(lambda count: np.zeros(count))
+        load(100)
+        time.sleep(0.01)
+        load(101)
+        time.sleep(0.01)
+        # using the first one makes the second the least recently used
+        load(100)
+        time.sleep(0.01)
+        load(102)
+        self.assertEqual(len(self.cache.get_entries()), 2)
+        key = self.cache.get_key(load.__wrapped__, (101,), {})
+        self.assertIsNone(self.cache.get(key))
+        self.assertIsNotNone(self.cache.get(self.cache.get_key(load.__wrapped__, (100,), {})))
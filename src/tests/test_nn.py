@@ -1,7 +1,8 @@
-import unittest, random
+import unittest, random, tracemalloc, tempfile, os, multiprocessing
 
 from neural_net import NeuralNet as NN
 from utilities import *
+from dataset import Dataset, DatasetWriter
 
 import numpy as np
 
@@ -23,6 +24,13 @@ class TestNN(unittest.TestCase):
         expected=[[0],[0],[1]]
         self.assertEqual(result,expected)
 
+    def test_neuronize_array(self):
+        y=np.array([2,0,1,3])
+        self.assertEqual(neuronize(y).tolist(),neuronize([[2],[0],[1],[3]]))
+        self.assertEqual(neuronize(y.reshape(-1,1)).tolist(),neuronize([[2],[0],[1],[3]]))
+        self.assertEqual(neuronize(np.array([[0],[1]])).tolist(),[[0],[1]])
+        self.assertEqual(get_labels(neuronize(y)).tolist(),[2,0,1,3])
+
     def test_weight_dimensions(self):
         nn=NN((2,2,1),verbose=0)
 
@@ -61,6 +69,274 @@ class TestNN(unittest.TestCase):
             self.assertEqual(nn.outputs[2].shape,(1,1))
             self.assertEqual(nn.get_output().shape,(1,))
 
+    def test_epoch_sampler(self):
+        sampler=EpochSampler(10,4)
+        batches=list(sampler.batches(25))
+        self.assertEqual([len(indices) for trial,indices in batches],[4,4,2,4,4,2,4,1])
+        self.assertEqual([trial for trial,indices in batches],[0,4,8,10,14,18,20,24])
+        for start in (0,3):
+            epoch=np.concatenate([indices for trial,indices in batches[start:start+3]])
+            self.assertEqual(sorted(epoch.tolist()),list(range(10)))
+        self.assertEqual(sampler.epoch,2)
+
+    def test_read_csv_array(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path=os.path.join(folder,"data.csv")
+            with open(path,"w") as f:
+                f.write("Id,a,b\n")
+                for i in range(10):
+                    f.write("%s,%s,%s\n"%(i,i/4,-i))
+                f.write("\n")
+            for chunk_size in (3,100):
+                for sidecar in os.listdir(folder):
+                    if sidecar.endswith(".npy"):
+                        os.remove(os.path.join(folder,sidecar))
+                data=read_csv_array(path,chunk_size=chunk_size)
+                self.assertEqual(data.shape,(10,3))
+                self.assertTrue(np.array_equal(data[:,1],np.arange(10)/4))
+            self.assertTrue(os.path.isfile(get_sidecar_path(path)))
+
+            cached=read_csv_array(path)
+            self.assertIsInstance(cached,np.memmap)
+            cached[0]=7
+            self.assertTrue(np.array_equal(read_csv_array(path),data))
+
+            #a changed csv gets a new sidecar
+            with open(path,"a") as f:
+                f.write("10,2.5,-10\n")
+            self.assertEqual(read_csv_array(path).shape,(11,3))
+            self.assertEqual(len([name for name in os.listdir(folder) if name.endswith(".npy")]),1)
+
+            X,Y,X_valid,Y_valid=get_data_1csv(path,0.7)
+            self.assertEqual((X.shape,Y.shape,X_valid.shape,Y_valid.shape),((8,2),(8,1),(3,2),(3,1)))
+            self.assertTrue(np.array_equal(X[:,0],Y[:,0]/4))
+
+    def test_read_csv_array_processes(self):
+        #processes loading the same csv at once each parse into their own file, and all but one sidecar
+        #are thrown away
+        with tempfile.TemporaryDirectory() as folder:
+            path=os.path.join(folder,"data.csv")
+            with open(path,"w") as f:
+                f.write("Id,a,b\n")
+                for i in range(5000):
+                    f.write("%s,%s,%s\n"%(i,i/4,-i))
+            with multiprocessing.Pool(4) as pool:
+                arrays=pool.starmap(read_csv_array,[(path,True,100)]*4)
+            for array in arrays:
+                self.assertEqual(array.shape,(5000,3))
+                self.assertTrue(np.array_equal(array[:,1],np.arange(5000)/4))
+            self.assertEqual(sorted(os.listdir(folder)),sorted(["data.csv",os.path.basename(get_sidecar_path(path))]))
+
+    def test_dataset(self):
+        X=np.random.random((3000,16,16)).astype(np.float32)
+        Y=np.random.randint(0,10,3000)
+        with tempfile.TemporaryDirectory() as folder:
+            writer=DatasetWriter(folder,len(X),(16,16))
+            for start in range(0,len(X),700):
+                writer.add(X[start:start+700],Y[start:start+700])
+            dataset=writer.close()
+            self.assertAlmostEqual(dataset.mean,float(X.mean()),places=5)
+            self.assertAlmostEqual(dataset.std,float(X.std()),places=5)
+            self.assertIsInstance(Dataset(folder).rows(),np.memmap)
+            self.assertTrue(np.array_equal(dataset.rows()[5],X[5].ravel()))
+
+            #training reads the float32 memory map a batch at a time, instead of making a float64 copy
+            nn=NN([256,8,10],verbose=0)
+            tracemalloc.start()
+            try:
+                nn.train(dataset.rows(),dataset.labels(),3000,batch_size=16)
+                current,peak=tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            self.assertLess(peak,X.nbytes)
+            self.assertEqual(nn.forward_batch(dataset.rows()).shape,(3000,10))
+
+            #the dataset itself gives batches normalized with its mean and std
+            normalized=(X.reshape(3000,-1)-dataset.mean)/dataset.std
+            self.assertTrue(np.allclose(dataset.get_rows(np.array([7,2])),normalized[[7,2]],atol=1e-6))
+            tracemalloc.start()
+            try:
+                nn.train(dataset,dataset.labels(),3000,batch_size=16)
+                current,peak=tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            self.assertLess(peak,X.nbytes)
+            self.assertTrue(np.allclose(nn.forward_batch(dataset),nn.forward_batch(normalized),atol=1e-5))
+            dataset=None
+
+    def test_forward_batch(self):
+        nn=NN([3,10,4],verbose=0)
+        X=np.random.random((7,3))
+        result=nn.forward_batch(X,chunk_size=3)
+        self.assertEqual(result.shape,(7,4))
+        for i in range(len(X)):
+            nn.forward(X[i])
+            self.assertTrue(np.allclose(result[i],nn.get_output()))
+
+    def test_predict(self):
+        nn=NN([3,10,4],verbose=0)
+        X=np.random.random((5,3))
+        predictions=nn.predict(X)
+        self.assertEqual(predictions.shape,(5,))
+        for i in range(len(X)):
+            nn.forward(X[i])
+            self.assertEqual(predictions[i],nn.get_prediction(nn.get_output()))
+
+    def test_batch_adjustments(self):
+        nn=NN([3,5,4,2],verbose=0)
+        X=np.random.random((6,3))
+        Y=np.random.random((6,2))
+        expected=[np.zeros(w.shape) for w in nn.weights[1:]]
+        for i in range(len(X)):
+            nn.forward(X[i])
+            for j,adj in enumerate(nn.get_adjustments(Y[i])):
+                expected[j]+=adj
+
+        nn.forward_rows(X)
+        for adj,exp in zip(nn.get_batch_adjustments(Y),expected):
+            self.assertTrue(np.allclose(adj,exp))
+
+    def test_training_step_does_not_allocate(self):
+        X=np.random.random((100,64))
+        #targets, and labels that gather turns into targets. softmax takes a few more views of the
+        #workspace, so its batch is bigger to keep them below the size of its smallest array
+        for output,Y,rows in (("tanh",np.random.random((100,10)),16),("softmax",np.random.randint(0,10,100),32)):
+            nn=NN([64,32,10],verbose=0,output=output)
+            workspace=nn.get_workspace(rows)
+            indices=np.arange(rows)
+            #warm up, then any array the step allocates shows up in the peak
+            nn.mini_batch(X,Y,indices,0.01)
+            smallest=min(a.nbytes for a in workspace.outputs+workspace.corrections[1:]+workspace.adjustments[1:])
+
+            tracemalloc.start()
+            try:
+                for i in range(10):
+                    current,peak=tracemalloc.get_traced_memory()
+                    tracemalloc.reset_peak()
+                    nn.mini_batch(X,Y,indices,0.01)
+                    after,peak=tracemalloc.get_traced_memory()
+                    self.assertLess(peak-current,smallest)
+            finally:
+                tracemalloc.stop()
+            self.assertIs(nn.workspace,workspace)
+
+    def test_softmax(self):
+        X,Y,a,b=get_data_1csv("tests/3outputs2bools.csv",1)
+        labels=get_labels(Y)
+        nn=NN([2,10,3],verbose=0,output="softmax")
+        nn.train(X,labels,3000,batch_size=4)
+        outputs=nn.forward_batch(X)
+        self.assertTrue(np.allclose(outputs.sum(axis=1),1))
+        self.assertEqual(nn.get_accuracy(X,labels),1.0)
+
+        nn.forward(X[0])
+        self.assertTrue(np.allclose(nn.get_output(),outputs[0]))
+        #the batch adjustments of labels match the per-sample ones of one-hot targets
+        targets=neuronize(labels)
+        expected=[np.zeros(w.shape) for w in nn.weights[1:]]
+        for i in range(len(X)):
+            nn.forward(X[i])
+            for j,adj in enumerate(nn.get_adjustments(targets[i])):
+                expected[j]+=adj
+        nn.get_workspace(len(X))
+        nn.forward_workspace(nn.gather(X,labels,np.arange(len(X))))
+        nn.backpropagate(len(X))
+        for adj,exp in zip(nn.workspace.adjustments[1:],expected):
+            self.assertTrue(np.allclose(adj,exp))
+
+    def test_train_batch_gradient(self):
+        #a batch is one gradient step for all layers, none of them sees weights already adjusted for it
+        X=np.random.random((32,5))
+        Y=np.random.randint(0,2,(32,1)).astype(float)
+        nn=NN([5,8,1],verbose=0,learning_rate=0.1)
+        expected=NN([5,8,1],verbose=0,learning_rate=0.1,weights=[w.copy() for w in nn.weights[1:]])
+        nn.train(X,Y,32,batch_size=32)
+        expected.get_workspace(32)
+        expected.forward_rows(X)
+        expected.adjust_weights(expected.get_batch_adjustments(Y),0.1)
+        for w,e in zip(nn.weights[1:],expected.weights[1:]):
+            self.assertTrue(np.allclose(w,e))
+
+    def test_float32(self):
+        X,Y,a,b=get_data_1csv("tests/3outputs2bools.csv",1)
+        nn=NN([2,10,3],verbose=0,dtype=np.float32)
+        nn.train(X,Y,100,batch_size=10)
+        for w in nn.weights+nn.workspace.outputs+nn.workspace.adjustments[1:]:
+            self.assertEqual(w.dtype,np.float32)
+        self.assertEqual(nn.forward_batch(X).dtype,np.float32)
+        nn.forward(X[0])
+        nn.backward(neuronize(Y)[0])
+        self.assertEqual(nn.get_output().dtype,np.float32)
+        self.assertEqual(nn.weights[1].dtype,np.float32)
+
+    def test_early_stopping(self):
+        X,Y,a,b=get_data_1csv("tests/6bools.csv",1)
+        nn=NN([6,20,1],verbose=0,learning_rate=0.1)
+        nn.train(X,Y,100000,valid_X=X,valid_Y=Y,eval_interval=500,patience=3)
+        self.assertLess(nn.stopped_trial,100000)
+        self.assertEqual(len(nn.history),nn.stopped_trial//500)
+        self.assertEqual(nn.best_accuracy,max(accuracy for trial,accuracy in nn.history))
+        self.assertEqual(nn.get_accuracy(X,Y),nn.best_accuracy)
+
+    def test_validation_fewer_trials_than_interval(self):
+        #no check runs during training, so the final check is the only one
+        X,Y,a,b=get_data_1csv("tests/6bools.csv",1)
+        nn=NN([6,20,1],verbose=0,learning_rate=0.1)
+        nn.train(X,Y,100,valid_X=X,valid_Y=Y,eval_interval=1000)
+        self.assertEqual(nn.history,[(100,nn.best_accuracy)])
+        self.assertEqual(nn.stopped_trial,100)
+
+    def test_save_load(self):
+        nn=NN([3,7,5,2],verbose=0,learning_rate=0.05,dtype=np.float32,optimizer="adam")
+        X=np.random.random((10,3))
+        with tempfile.TemporaryDirectory() as folder:
+            path=os.path.join(folder,"model.nnet")
+            nn.save(path)
+            for mmap in (True,False):
+                loaded=NN.load(path,mmap=mmap)
+                self.assertEqual(loaded.sizes,[3,7,5,2])
+                self.assertEqual(loaded.get_hyperparameters(),nn.get_hyperparameters())
+                for a,b in zip(loaded.weights,nn.weights):
+                    self.assertEqual(a.shape,b.shape)
+                    self.assertTrue(np.array_equal(a,b))
+                self.assertTrue(np.array_equal(loaded.forward_batch(X),nn.forward_batch(X)))
+                #copy-on-write, training a loaded net leaves the file alone
+                loaded.train(X,[[1,0]]*5+[[0,1]]*5,10)
+                loaded=None
+            self.assertTrue(np.array_equal(NN.load(path).weights[1],nn.weights[1]))
+
+            with open(path,"wb") as f:
+                f.write(b"not a model file")
+            with self.assertRaises(ValueError):
+                NN.load(path)
+            #truncated files, down to an empty one
+            nn.save(path)
+            with open(path,"rb") as f:
+                content=f.read()
+            for length in (0,6,20):
+                with open(path,"wb") as f:
+                    f.write(content[:length])
+                with self.assertRaises(ValueError):
+                    NN.load(path)
+
+    def test_make_predictions_csv(self):
+        nn=NN([2,5,3],verbose=0)
+        X=np.random.random((11,2))
+        with tempfile.TemporaryDirectory() as folder:
+            target=os.path.join(folder,"target.csv")
+            with open(target,"w") as f:
+                f.write("Id,a,b\n")
+                for i,x in enumerate(X):
+                    f.write("%s,%r,%r\n"%(100+i,float(x[0]),float(x[1])))
+            predictions=os.path.join(folder,"predictions.csv")
+            count=nn.make_predictions_csv(target,predictions,chunk_size=4)
+            with open(predictions) as f:
+                lines=f.read().split()
+        self.assertEqual(count,11)
+        self.assertEqual(lines[0],"Id,Prediction")
+        expected=["%s,%s"%(100+i,p) for i,p in enumerate(nn.predict(X))]
+        self.assertEqual(lines[1:],expected)
+
     def test_1_hidden_2n_xor(self):
         X=[[0,0],[0,1],[1,0],[1,1]]
         Y=[[0],[1],[1],[0]]
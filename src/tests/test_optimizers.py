@@ -0,0 +1,60 @@
+import unittest, random
+
+from neural_net import NeuralNet as NN
+from optimizers import *
+from utilities import *
+
+import numpy as np
+
+random.seed(123)
+np.random.seed(123)
+
+class TestOptimizers(unittest.TestCase):
+
+    def test_sgd(self):
+        weights=np.ones((2,3))
+        optimizer=SGD()
+        optimizer.setup([weights])
+        optimizer.step(0,weights,np.full((2,3),2.0),0.1)
+        self.assertTrue(np.allclose(weights,0.8))
+
+    def test_momentum(self):
+        weights=np.zeros((2,3))
+        optimizer=Momentum(momentum=0.5)
+        optimizer.setup([weights])
+        optimizer.step(0,weights,np.ones((2,3)),0.1)
+        optimizer.step(0,weights,np.ones((2,3)),0.1)
+        #velocity is -0.1 after the first step and -0.15 after the second
+        self.assertTrue(np.allclose(weights,-0.25))
+
+    def test_nesterov(self):
+        weights=np.zeros((2,3))
+        optimizer=Nesterov(momentum=0.5)
+        optimizer.setup([weights])
+        optimizer.step(0,weights,np.ones((2,3)),0.1)
+        self.assertTrue(np.allclose(weights,-0.15))
+
+    def test_adam(self):
+        weights=np.zeros((2,3))
+        optimizer=Adam()
+        optimizer.setup([weights])
+        optimizer.step(0,weights,np.array([[1,-2,3],[100,-0.5,7]]),0.01)
+        #the first step moves every weight by the learning rate, against its adjustment
+        self.assertTrue(np.allclose(weights,[[-0.01,0.01,-0.01],[-0.01,0.01,-0.01]]))
+
+    def test_get_optimizer(self):
+        self.assertIsInstance(get_optimizer("nesterov"),Nesterov)
+        optimizer=Adam(beta1=0.8)
+        self.assertIs(get_optimizer(optimizer),optimizer)
+        with self.assertRaises(ValueError):
+            get_optimizer("rmsprop")
+
+    def test_optimizers_train(self):
+        X,Y,a,b=get_data_1csv("tests/3bools.csv",1)
+        for optimizer,learning_rate in (("sgd",0.1),("momentum",0.01),("nesterov",0.01),("adam",0.01)):
+            nn=NN([3,10,1],verbose=0,learning_rate=learning_rate,optimizer=optimizer)
+            nn.train(X,Y,5000)
+            self.assertEqual(nn.get_error_report("train",X,Y)["train accuracy"],1.0)
+
+if __name__=="__main__":
+    unittest.main()
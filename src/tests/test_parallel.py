@@ -0,0 +1,77 @@
+import unittest, random
+
+from neural_net import NeuralNet as NN
+from parallel import *
+from utilities import *
+
+import numpy as np
+
+random.seed(123)
+np.random.seed(123)
+
+class TestParallel(unittest.TestCase):
+
+    def test_shared_arrays(self):
+        arrays=[np.random.random((3,4)),np.random.random((5,))]
+        shared=SharedArrays.copy_of(arrays,float)
+        attached=SharedArrays.attach(shared.spec())
+        for a,b in zip(arrays,attached.arrays):
+            self.assertTrue(np.array_equal(a,b))
+        attached.arrays[0][1,2]=42
+        self.assertEqual(shared.arrays[0][1,2],42)
+        attached.close()
+        shared.close()
+
+    def test_split_trials(self):
+        self.assertEqual(split_trials(10,3),[4,3,3])
+        self.assertEqual(split_trials(2,4),[1,1,0,0])
+
+    def test_hogwild(self):
+        X,Y,a,b=get_data_1csv("tests/3bools.csv",1)
+        nn=NN([3,10,1],verbose=0,learning_rate=0.1)
+        before=[w.copy() for w in nn.weights]
+        train_hogwild(nn,X,Y,10000,2)
+        self.assertFalse(np.array_equal(before[1],nn.weights[1]))
+        self.assertEqual(nn.get_error_report("train",X,Y)["train accuracy"],1.0)
+
+    def test_hogwild_labels(self):
+        #several outputs share a label vector, not a one-hot matrix
+        X,Y,a,b=get_data_1csv("tests/3outputs2bools.csv",1)
+        nn=NN([2,8,3],verbose=0,learning_rate=0.1)
+        data,targets=share_data(nn,X,nn.get_targets(Y))
+        self.assertEqual(targets.arrays[0].shape,(4,))
+        self.assertTrue(np.array_equal(targets.arrays[0],get_labels(Y)))
+        data.close()
+        targets.close()
+        train_hogwild(nn,X,Y,2000,2)
+        self.assertEqual(nn.get_accuracy(X,Y),1.0)
+
+    def test_data_parallel_is_reproducible(self):
+        X,Y,a,b=get_data_1csv("tests/6bools.csv",1)
+        results=[]
+        for i in range(2):
+            np.random.seed(5)
+            nn=NN([6,12,1],verbose=0,learning_rate=0.01)
+            train_data_parallel(nn,X,Y,2000,3,16)
+            results.append(nn.weights)
+        for a,b in zip(*results):
+            self.assertTrue(np.array_equal(a,b))
+
+    def test_data_parallel_matches_batch_adjustments(self):
+        X=np.random.random((8,3))
+        Y=np.array([[1,0],[0,1]]*4,dtype=float)
+        nn=NN([3,5,2],verbose=0,learning_rate=0.1)
+        expected=NN([3,5,2],verbose=0,learning_rate=0.1)
+        for a,b in zip(expected.weights,nn.weights):
+            np.copyto(a,b)
+
+        #one batch of every row, so the order of the rows does not matter. the workers get the labels
+        #and make the one-hot targets of their shards
+        train_data_parallel(nn,X,Y,8,3,8)
+        expected.forward_rows(X)
+        expected.adjust_weights(expected.get_batch_adjustments(Y),0.1)
+        for a,b in zip(expected.weights,nn.weights):
+            self.assertTrue(np.allclose(a,b))
+
+if __name__=="__main__":
+    unittest.main()
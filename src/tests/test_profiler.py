@@ -0,0 +1,71 @@
+import unittest, random, time, tempfile, os, json
+
+from neural_net import NeuralNet as NN
+from profiler import Profiler, PROFILER, NULL_SPAN
+from utilities import *
+
+import numpy as np
+
+random.seed(123)
+np.random.seed(123)
+
+class TestProfiler(unittest.TestCase):
+
+    def test_nested_spans(self):
+        profiler=Profiler(enabled=True)
+        for i in range(3):
+            with profiler.span("outer"):
+                with profiler.span("inner"):
+                    time.sleep(0.001)
+                with profiler.span("inner"):
+                    pass
+        self.assertEqual(sorted(profiler.stats),["outer","outer/inner"])
+        self.assertEqual(profiler.stats["outer"].count,3)
+        self.assertEqual(profiler.stats["outer/inner"].count,6)
+        self.assertEqual(sum(profiler.stats["outer/inner"].histogram),6)
+        self.assertGreaterEqual(profiler.stats["outer"].total,profiler.stats["outer/inner"].total)
+
+        summary=profiler.get_summary()
+        self.assertEqual([row[0] for row in summary],["outer","outer/inner"])
+        self.assertEqual(summary[0][-1],1.0)
+
+        with tempfile.TemporaryDirectory() as folder:
+            path=os.path.join(folder,"trace.json")
+            profiler.write_trace(path)
+            with open(path) as f:
+                events=json.load(f)["traceEvents"]
+        self.assertEqual(len(events),9)
+        self.assertEqual({event["ph"] for event in events},{"X"})
+
+    def test_disabled(self):
+        profiler=Profiler()
+        self.assertIs(profiler.span("outer"),NULL_SPAN)
+        with profiler.span("outer"):
+            pass
+        self.assertEqual(profiler.stats,{})
+
+    def test_training_spans(self):
+        X,Y,a,b=get_data_1csv("tests/3outputs2bools.csv",1)
+        nn=NN([2,5,3],verbose=0)
+        PROFILER.reset()
+        PROFILER.enable()
+        try:
+            nn.train(X,Y,40,batch_size=4)
+        finally:
+            PROFILER.disable()
+        self.assertEqual(PROFILER.stats["train/mini_batch"].count,10)
+        #one adjust per layer
+        self.assertEqual(PROFILER.stats["train/mini_batch/backward/adjust"].count,20)
+        PROFILER.reset()
+
+    def test_performance_timer(self):
+        timer=PerformanceTimer()
+        timer.tick("a")
+        timer.tick("b")
+        timer.tick("a")
+        timer.tick("b")
+        self.assertEqual(timer.times["a"][1],2)
+        self.assertEqual(timer.times["start"][1],1)
+
+if __name__=="__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest, random
+
+from neural_net import NeuralNet as NN
+from scheduler import *
+from utilities import *
+
+import numpy as np
+
+random.seed(123)
+np.random.seed(123)
+
+class TestScheduler(unittest.TestCase):
+
+    def test_get_rungs(self):
+        #the last rung always trains to max_trials
+        self.assertEqual(get_rungs(27,100,10000,3),[(27,100),(9,300),(3,900),(1,10000)])
+        self.assertEqual(get_rungs(10,100,10000,3),[(10,100),(3,300),(1,10000)])
+        self.assertEqual(get_rungs(27,100,500,3),[(27,100),(9,300),(3,500)])
+        self.assertEqual(get_rungs(1,100,500,3),[(1,500)])
+
+    def test_get_brackets(self):
+        brackets=get_brackets(1,81,3)
+        self.assertEqual([count for count,trials in brackets],[81,34,15,8,5])
+        self.assertEqual([trials for count,trials in brackets],[1,3,9,27,81])
+
+    def test_successive_halving(self):
+        #a config's score is its quality times the share of max_trials trained, so the best quality wins
+        steps=[]
+        def run_step(step):
+            config,net,first_trial,stop_trial,trial_count=step
+            steps.append(step)
+            if config["quality"]<0:
+                return None,dict(config,error="bad")
+            net=(net or 0)+stop_trial-first_trial
+            return net,dict(config,trials=stop_trial,valid_accuracy=config["quality"]*net/trial_count)
+        configs=[{"quality":q} for q in (0.3,-1,0.9,0.5,0.1,0.7,0.2,0.8,0.4)]
+        reported=[]
+        finished=successive_halving(configs,run_step,10,90,3,report=reported.append)
+        self.assertEqual(len(steps),9+3+1)
+        self.assertEqual(len(reported),len(steps))
+        self.assertEqual([result["quality"] for result,net in finished],[0.9])
+        #the winner continued from its trials instead of starting over
+        self.assertEqual(finished[0][1],90)
+        self.assertEqual([step[2:] for step in steps if step[0]["quality"]==0.9],[(0,10,90),(10,30,90),(30,90,90)])
+
+    def test_continued_training(self):
+        X,Y,a,b=get_data_1csv("tests/3bools.csv",1)
+        nn=NN([3,10,1],learning_rate=0.1,final_learning_rate=0.01)
+        rates=[]
+        nn.get_learning_rate=lambda trial,trial_count:rates.append((trial,trial_count)) or 0.1
+        nn.train(X,Y,100,first_trial=40,stop_trial=60)
+        self.assertEqual(rates[0],(40,100))
+        self.assertEqual(rates[-1],(59,100))
+        self.assertEqual(len(rates),20)
+        self.assertRaises(ValueError,nn.train,X,Y,100,1,None,None,1000,5,0.0,60,40)
+
+    def test_train_step(self):
+        X,Y,X_valid,Y_valid=get_data_2csv("tests/3outputs2bools.csv","tests/3outputs2bools.csv",0.75)
+        config={"sizes":[2,4,3],"learning_rate":0.1,"seed":1}
+        net,result=train_step((config,None,0,500,2000),X,Y,X_valid,Y_valid)
+        self.assertEqual(result["trials"],500)
+        self.assertTrue(0<=get_score(result)<=1)
+        weights=[w.copy() for w in net.weights]
+        net,result=train_step((config,net,500,1500,2000),X,Y,X_valid,Y_valid)
+        self.assertEqual((result["first_trial"],result["trials"]),(500,1500))
+        self.assertFalse(np.array_equal(weights[1],net.weights[1]))
+        net,result=train_step((dict(config,optimizer="nope"),None,0,500,2000),X,Y,X_valid,Y_valid)
+        self.assertIsNone(net)
+        self.assertIn("error",result)
@@ -0,0 +1,67 @@
+import unittest, random, os, tempfile
+
+from results_store import ResultsStore
+from sweep import *
+import utilities
+
+import numpy as np
+
+random.seed(123)
+np.random.seed(123)
+
+class TestSweep(unittest.TestCase):
+
+    def test_get_configs(self):
+        configs=get_configs({"learning_rate":[0.1,0.01],"batch_size":[1,4,8]},2)
+        self.assertEqual(len(configs),12)
+        self.assertEqual(configs[0],{"batch_size":1,"learning_rate":0.1,"seed":0})
+        self.assertEqual(len(set(tuple(sorted(c.items())) for c in configs)),12)
+
+    def test_results_store(self):
+        with tempfile.TemporaryDirectory() as folder:
+            store=ResultsStore(os.path.join(folder,"sweep.db"))
+            store.add({"sweep":"a","sizes":[2,3,1],"valid_accuracy":0.5,"duration":1.0})
+            store.add({"sweep":"a","sizes":[2,4,1],"valid_accuracy":0.9,"duration":1.0})
+            store.add({"sweep":"a","sizes":[2,5,1],"error":"ValueError: bad"})
+            store.add({"sweep":"b","sizes":[2,6,1],"valid_accuracy":1.0,"duration":1.0})
+            store.close()
+
+            #a second connection sees everything the first one wrote
+            store=ResultsStore(os.path.join(folder,"sweep.db"))
+            best=store.best("a")
+            self.assertEqual([r["sizes"] for r in best],["[2, 4, 1]","[2, 3, 1]"])
+            self.assertEqual(store.best(count=1)[0]["sweep"],"b")
+            self.assertRaises(ValueError,store.best,None,10,"sizes; drop table results")
+            store.close()
+
+    def test_run_sweep(self):
+        data=get_data_2csv("tests/3outputs2bools.csv","tests/3outputs2bools.csv",0.75)
+        grids={"sizes":[[2,2,3]],"learning_rate":[0.1],"final_learning_rate":[-1],"batch_size":[1],
+                "optimizer":["sgd","nope"],"activation":["tanh"],"output":["tanh","softmax"],
+                "trials":[200],"dtype":["float64"]}
+        configs=get_configs(grids,1)
+        with tempfile.TemporaryDirectory() as folder:
+            store=ResultsStore(os.path.join(folder,"sweep.db"))
+            failed=run_sweep(data,configs,2,store,"test")
+            self.assertEqual(failed,2)
+            best=store.best("test")
+            self.assertEqual(len(best),2)
+            self.assertEqual({r["output"] for r in best},{"tanh","softmax"})
+            for r in best:
+                self.assertTrue(0<=r["train_accuracy"]<=1)
+                self.assertIsNotNone(r["valid_accuracy"])
+            store.close()
+
+    def test_save_report_header(self):
+        cwd=os.getcwd()
+        with tempfile.TemporaryDirectory() as folder:
+            os.chdir(folder)
+            try:
+                for i in range(3):
+                    utilities.save_report({"learning rate":i,"batch size":1})
+                with open(os.path.join(utilities.LOGFOLDER,"hyperparameters.csv")) as f:
+                    lines=f.read().splitlines()
+            finally:
+                os.chdir(cwd)
+        self.assertEqual(len(lines),4)
+        self.assertEqual(lines.count(lines[0]),1)
@@ -0,0 +1,60 @@
+import unittest, tempfile, os
+
+from neural_net import NeuralNet as NN
+from training_log import TrainingLog, read_log
+
+import numpy as np
+
+np.random.seed(123)
+
+class TestTrainingLog(unittest.TestCase):
+
+    def test_ring_buffer(self):
+        with tempfile.TemporaryDirectory() as folder:
+            log=TrainingLog(folder,capacity=4,interval=2)
+            for step in range(12):
+                log.record(step,{"a":[np.full((2,3),step),np.full(1,-step)]})
+            log.close()
+            history=read_log(folder)
+        #steps 0, 2, .. 10 were recorded, only the last 4 kept
+        self.assertEqual(history["steps"].tolist(),[4,6,8,10])
+        self.assertEqual(history["a"][0].shape,(4,2,3))
+        self.assertEqual(history["a"][0][:,1,2].tolist(),[4,6,8,10])
+        self.assertEqual(history["a"][1].shape,(4,1))
+        self.assertEqual(history["a"][1][:,0].tolist(),[-4,-6,-8,-10])
+
+    def test_training_logs(self):
+        X=np.random.random((20,3))
+        Y=[[1,0]]*10+[[0,1]]*10
+        cwd=os.getcwd()
+        with tempfile.TemporaryDirectory() as folder:
+            os.chdir(folder)
+            try:
+                nn=NN([3,4,2],verbose=0,logging=1,log_interval=5)
+                nn.train(X,Y,50,batch_size=2)
+                history=read_log("logs")
+            finally:
+                os.chdir(cwd)
+        self.assertEqual(history["steps"].tolist(),list(range(5,26,5)))
+        self.assertEqual([w.shape for w in history["weights"]],[(5,4,4),(5,2,5)])
+        self.assertTrue(np.array_equal(history["weights"][1][-1],nn.weights[2]))
+        self.assertEqual([a.shape for a in history["outputs"]],[(5,4),(5,5),(5,2)])
+        #train stopped the flusher thread and released the buffers
+        self.assertIsNone(nn.training_log.flusher)
+        self.assertEqual(nn.training_log.buffers,{})
+
+    def test_record_after_close(self):
+        with tempfile.TemporaryDirectory() as folder:
+            log=TrainingLog(folder,capacity=4)
+            self.assertIsNone(log.flusher)
+            log.record(0,{"a":[np.zeros(2)]})
+            self.assertTrue(log.flusher.is_alive())
+            log.close()
+            log.record(1,{"a":[np.ones(2)]})
+            log.close()
+            history=read_log(folder)
+        self.assertEqual(history["steps"].tolist(),[0,1])
+        self.assertEqual(history["a"][0].tolist(),[[0,0],[1,1]])
+
+if __name__=="__main__":
+    unittest.main()
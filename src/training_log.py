@@ -0,0 +1,117 @@
+import os, json, threading
+import numpy as np
+from numpy.lib.format import open_memmap
+
+#a training log is a folder with one <name>-log.npy file per logged item, plus log.json. every .npy file
+#is a memory-mapped ring buffer of shape (capacity, values per record): a record is every array of the
+#item flattened into one row, and once capacity records were written the oldest ones are overwritten.
+#log.json has the number of records written so far, the step of every slot and the shape of every array
+#of every item, so read_log can turn rows back into arrays
+
+class TrainingLog:
+    def __init__(self,folder,capacity=10000,interval=1,flush_interval=5):
+        #only every interval-th step is recorded. from the first record until close, a background thread
+        #flushes the buffers to disk every flush_interval seconds, so recording never waits for the disk
+        self.folder=folder
+        self.capacity=capacity
+        self.interval=interval
+        self.flush_interval=flush_interval
+        self.position=0
+        self.buffers={}
+        self.shapes={}
+        self.steps=np.zeros(capacity,dtype=np.int64)
+        self.lock=threading.Lock()
+
+        os.makedirs(folder,exist_ok=True)
+        for name in os.listdir(folder):
+            if name.endswith("-log.npy") or name=="log.json":
+                os.remove(os.path.join(folder,name))
+
+        self.stopped=threading.Event()
+        self.flusher=None
+
+    def get_path(self,name):
+        return os.path.join(self.folder,name+"-log.npy")
+
+    def is_recorded(self,step):
+        return step%self.interval==0
+
+    def record(self,step,items):
+        #where items maps names to lists of arrays. the arrays of a name must keep their shapes
+        if not self.is_recorded(step):
+            return
+        if self.flusher is None:
+            self.stopped.clear()
+            self.flusher=threading.Thread(target=self.keep_flushing,args=(self.flush_interval,),daemon=True)
+            self.flusher.start()
+        row=self.position%self.capacity
+        for name,arrays in items.items():
+            if name not in self.buffers:
+                self.add_buffer(name,arrays)
+            buffer=self.buffers[name][row]
+            start=0
+            for a in arrays:
+                buffer[start:start+a.size]=a.ravel()
+                start+=a.size
+        self.steps[row]=step
+        self.position+=1
+
+    def add_buffer(self,name,arrays):
+        length=sum(a.size for a in arrays)
+        dtype=np.result_type(*arrays)
+        with self.lock:
+            if name in self.shapes:
+                #recorded before close, keep the old records
+                self.buffers[name]=open_memmap(self.get_path(name),mode="r+")
+            else:
+                self.shapes[name]=[list(a.shape) for a in arrays]
+                self.buffers[name]=open_memmap(self.get_path(name),mode="w+",dtype=dtype,
+                        shape=(self.capacity,length))
+
+    def flush(self):
+        with self.lock:
+            for buffer in self.buffers.values():
+                buffer.flush()
+            info={"position":self.position,
+                    "capacity":self.capacity,
+                    "interval":self.interval,
+                    "steps":self.steps.tolist(),
+                    "shapes":self.shapes}
+            path=os.path.join(self.folder,"log.json")
+            with open(path+".tmp","w") as f:
+                json.dump(info,f)
+            os.replace(path+".tmp",path)
+
+    def keep_flushing(self,flush_interval):
+        while not self.stopped.wait(flush_interval):
+            self.flush()
+
+    def close(self):
+        #stops the thread and releases the buffers. recording again starts over where this left off
+        if self.flusher is not None:
+            self.stopped.set()
+            self.flusher.join()
+            self.flusher=None
+        self.flush()
+        with self.lock:
+            self.buffers={}
+
+def read_log(folder):
+    #returns {"steps": 1d array of the step of every record, oldest first, name: [one array per array
+    #of the item, of shape (records,)+its shape] ...}
+    with open(os.path.join(folder,"log.json")) as f:
+        info=json.load(f)
+    count=min(info["position"],info["capacity"])
+    #once the ring buffer wrapped around, the oldest record is the one after the newest
+    order=(np.arange(count)+info["position"])%count if count else np.arange(0)
+
+    history={"steps":np.array(info["steps"],dtype=np.int64)[order]}
+    for name,shapes in info["shapes"].items():
+        rows=np.load(os.path.join(folder,name+"-log.npy"),mmap_mode="r")[order]
+        history[name]=[]
+        start=0
+        for shape in shapes:
+            size=int(np.prod(shape))
+            history[name].append(rows[:,start:start+size].reshape([count]+shape))
+            start+=size
+    return history
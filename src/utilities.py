@@ -1,7 +1,13 @@
 
-import os, os.path, time, platform, random, csv
+import os, os.path, time, platform, random, csv, glob, itertools, tempfile
 import numpy as np
+from numpy.lib.format import open_memmap
 from constants import *
+try:
+    import fcntl
+except ImportError:
+    #no advisory file locks on windows, reports are appended without them there
+    fcntl=None
 
 class PerformanceTimer:
     def __init__(self):
@@ -15,7 +21,7 @@ class PerformanceTimer:
         self.last_time=t
 
         if self.last_label not in self.times:
-            self.times[self.last_label]=[delta,1]
+            self.times[self.last_label]=[0.0,0]
         self.times[self.last_label][0]+=delta
         self.times[self.last_label][1]+=1
 
@@ -47,17 +53,32 @@ def save_report(report):
 
     header=",".join(keys)
     filename=LOGFOLDER+os.sep+"hyperparameters.csv"
-    data=""
-    if not os.path.isdir(LOGFOLDER):
-        os.mkdir(LOGFOLDER)
-    if not os.path.isfile(filename):
-        with open(filename,"w") as f:
-            f.write(header+"\n")
+    os.makedirs(LOGFOLDER,exist_ok=True)
     with open(filename,"a") as f:
-        f.write(",".join(items)+"\n")
+        #runs at the same time take turns, so lines never interleave and only the first run writes the header
+        if fcntl:
+            fcntl.flock(f,fcntl.LOCK_EX)
+        try:
+            if f.seek(0,os.SEEK_END)==0:
+                f.write(header+"\n")
+            f.write(",".join(items)+"\n")
+            f.flush()
+        finally:
+            if fcntl:
+                fcntl.flock(f,fcntl.LOCK_UN)
 
 def neuronize(Y):
     #convert Y=[[2],[0],[1]...] to Y=[[0,0,1],[1,0,0],[0,1,0]...], or does nothing if Y=[[1],[0] ...]
+    #lists give lists, arrays (including label vectors Y=[2,0,1...]) give an int array
+    if isinstance(Y,np.ndarray):
+        Y=Y.reshape(len(Y),-1)
+        if Y.shape[1]>1 or Y.max(initial=-1)==1:
+            return Y
+        labels=Y[:,0].astype(np.intp)
+        one_hot=np.zeros((len(Y),labels.max(initial=-1)+1),dtype=int)
+        one_hot[np.arange(len(Y)),labels]=1
+        return one_hot
+
     highest=-1
     for i in Y:
         highest=i[0] if i[0]>highest else highest
@@ -69,59 +90,140 @@ def neuronize(Y):
     new_y=[[1 if i[0]==j else 0 for j in range(highest+1)] for i in Y]
     return new_y
 
-def get_data_2csv(csv_train,csv_valid,validation_ratio,has_header=True,normalize=False):
-    #ignores the first column, optionally ignores the first row (has_header)
+def get_sidecar_path(path,has_header=True):
+    #the cached array of a csv is named after the csv's size and modification time, so editing the csv
+    #makes a new sidecar instead of silently reusing the stale one
+    info=os.stat(path)
+    return "%s.%s-%s%s.npy"%(path,info.st_size,info.st_mtime_ns,"" if has_header else "-noheader")
+
+def count_lines(f,block_size=1<<20):
+    count=0
+    last=b"\n"
+    block=f.read(block_size)
+    while block:
+        count+=block.count(b"\n")
+        last=block[-1:]
+        block=f.read(block_size)
+    return count+(last!=b"\n")
+
+def read_csv_array(path,has_header=True,chunk_size=4096,cache=True):
+    #parses a csv of numbers into a float64 array of shape (rows, columns), chunk_size lines at a time,
+    #straight into an array allocated once. with cache, the array is written to a .npy sidecar next to
+    #the csv, and later calls memory-map the sidecar instead of parsing. the memory map is copy-on-write,
+    #so changing the returned array never changes the sidecar
+    if cache:
+        sidecar=get_sidecar_path(path,has_header)
+        if os.path.isfile(sidecar):
+            return np.load(sidecar,mmap_mode="c")
+
+    with open(path,"rb") as f:
+        rows=count_lines(f)-(1 if has_header else 0)
+    with open(path,"r") as f:
+        if has_header:
+            f.readline()
+        start=f.tell()
+        columns=len(f.readline().split(","))
+        f.seek(start)
+
+        array=None
+        if cache:
+            try:
+                #every process parses into its own file, so processes loading the same csv at once don't
+                #write over each other's arrays
+                temporary=make_temporary_file(sidecar)
+                array=open_memmap(temporary,mode="w+",dtype=np.float64,shape=(max(rows,0),columns))
+            except OSError:
+                #can't write next to the csv, so just parse it
+                cache=False
+        if array is None:
+            array=np.empty((max(rows,0),columns))
+
+        done=0
+        lines=[line for line in itertools.islice(f,chunk_size) if not line.isspace()]
+        while lines:
+            chunk=np.loadtxt(lines,delimiter=",",ndmin=2)
+            array[done:done+len(chunk)]=chunk
+            done+=len(chunk)
+            lines=[line for line in itertools.islice(f,chunk_size) if not line.isspace()]
+
+    if not cache:
+        return array[:done]
+    if done<len(array):
+        #blank lines were counted as rows
+        trimmed=make_temporary_file(sidecar)
+        with open(trimmed,"wb") as f:
+            #a file, since np.save would add .npy to the name
+            np.save(f,array[:done])
+        array=None
+        os.remove(temporary)
+        temporary=trimmed
+    else:
+        array.flush()
+        array=None
+    if os.path.isfile(sidecar):
+        #another process finished the same sidecar first
+        os.remove(temporary)
+    else:
+        os.replace(temporary,sidecar)
+    for stale in glob.glob(glob.escape(path)+".*.npy"):
+        if stale!=sidecar:
+            try:
+                os.remove(stale)
+            except FileNotFoundError:
+                pass
+    return np.load(sidecar,mmap_mode="c")
+
+def make_temporary_file(path):
+    #an empty file with a unique name in the folder of path, named so it never looks like a sidecar
+    handle,temporary=tempfile.mkstemp(dir=os.path.dirname(path) or ".",prefix=os.path.basename(path)+".",
+            suffix=".tmp")
+    os.close(handle)
+    return temporary
+
+def split_rows(arrays,validation_ratio):
+    #shuffles the rows of arrays the same way, and splits every one of them in two at validation_ratio.
+    #returns the first parts, then the second parts
+    order=np.random.permutation(len(arrays[0]))
+    count=round(validation_ratio*len(order))
+    return [a[order[:count]] for a in arrays]+[a[order[count:]] for a in arrays]
+
+def get_labels(Y):
+    #the other way around: converts Y=[[2],[0],[1]...], Y=[2,0,1...] or Y=[[0,0,1],[1,0,0],[0,1,0]...]
+    #to the label vector [2,0,1...]
+    Y=np.asarray(Y)
+    if Y.ndim==2 and Y.shape[1]>1:
+        return Y.argmax(axis=1)
+    return Y.reshape(-1).astype(np.intp)
+
+def get_data_2csv(csv_train,csv_valid,validation_ratio,has_header=True,normalize=False,return_stats=False):
+    #ignores the first column, optionally ignores the first row (has_header).
+    #with return_stats, also returns the (mean, std) that X was normalized with, (0, 1) if it was not
     if validation_ratio<0 or validation_ratio>1:
         raise ValueError("bad validation ratio")
-    X,Y=[],[]
-    with open(csv_train,"r") as f:
-        reader=csv.reader(f,delimiter=",")
-        if has_header:
-            next(reader)
-        for line in reader:
-            X.append([float(i) for i in line[1:]])
+    X=read_csv_array(csv_train,has_header)[:,1:]
+    Y=read_csv_array(csv_valid,has_header)[:,1:]
 
+    mean,std=0.0,1.0
     if normalize:
-        X=np.array(X)
-        X-=X.mean()
-        X/=X.std()
+        mean,std=float(X.mean()),float(X.std())
 
-    with open(csv_valid,"r") as f:
-        reader=csv.reader(f,delimiter=",")
-        if has_header:
-            next(reader)
-        for line in reader:
-            Y.append([float(i) for i in line[1:]])
-
-    XY=[(X[i],Y[i]) for i in range(len(X))]
-    random.shuffle(XY)
-    
-    count=round(validation_ratio*len(X))
-    X_train=[a[0] for a in XY[:count]]
-    Y_train=[a[1] for a in XY[:count]]
-    X_valid=[a[0] for a in XY[count:]]
-    Y_valid=[a[1] for a in XY[count:]]
+    X_train,Y_train,X_valid,Y_valid=split_rows((X,Y[:len(X)]),validation_ratio)
+    if normalize:
+        #the split made copies, so the cached data is left alone
+        for part in (X_train,X_valid):
+            part-=mean
+            part/=std
 
+    if return_stats:
+        return X_train,Y_train,X_valid,Y_valid,(mean,std)
     return X_train,Y_train,X_valid,Y_valid
 
 def get_data_1csv(csv_name,validation_ratio,has_header=True):
+    #the first column is Y, the others are X
     if validation_ratio<0 or validation_ratio>1:
         raise ValueError("bad validation ratio")
-    X,Y=[],[]
-    with open(csv_name,"r") as f:
-        lines= f.readlines()
-    if has_header:
-        lines=lines[1:]
-    random.shuffle(lines)
-    X=[[float(i) for i in line.strip().split(",")[1:]] for line in lines]
-    Y=[[float(line[0])] for line in lines]
-    
-    count=round(validation_ratio*len(X))
-    X_train=X[:count]
-    Y_train=Y[:count]
-    X_valid=X[count:]
-    Y_valid=Y[count:]
-
+    data=read_csv_array(csv_name,has_header)
+    X_train,Y_train,X_valid,Y_valid=split_rows((data[:,1:],data[:,:1]),validation_ratio)
     return X_train,Y_train,X_valid,Y_valid
 
 def add_filename_prefix_to_path(prefix,source):
@@ -130,6 +232,29 @@ def add_filename_prefix_to_path(prefix,source):
     pieces=split[:-1]+[prefix+split[-1]]
     return os.sep.join(pieces)
 
+class EpochSampler:
+    #feeds training: hands out batches of row indices, going through every row once per epoch
+    #in a new random order each epoch
+    def __init__(self,row_count,batch_size):
+        self.row_count=row_count
+        self.batch_size=batch_size
+        self.epoch=0
+
+    def batches(self,trial_count):
+        #yields (trial, indices) until trial_count rows were handed out, where trial is the number of rows
+        #handed out before this batch. a batch never straddles two epochs, so the last batch of an epoch
+        #can be smaller than batch_size
+        trial=0
+        while trial<trial_count:
+            order=np.random.permutation(self.row_count)
+            for start in range(0,self.row_count,self.batch_size):
+                if trial>=trial_count:
+                    return
+                count=min(self.batch_size,self.row_count-start,trial_count-trial)
+                yield trial,order[start:start+count]
+                trial+=count
+            self.epoch+=1
+
 class Timer:
     #easy way to show updates every X number of seconds for big jobs.
     def __init__(self,interval):